@@ -6,18 +6,49 @@ Created by Geo Cherian Mathew.
 """
 import json
 import re
-from typing import List, Dict, Any, Optional, AsyncGenerator
+import time
+import asyncio
+import hashlib
+import itertools
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple, Deque
 from dataclasses import dataclass, field
 from datetime import datetime
 
+import numpy as np
 from groq import Groq, AsyncGroq
 
-from backend.config import GROQ_API_KEY, LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, MAX_MEMORY_MESSAGES
+from backend.config import (
+    GROQ_API_KEY, LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, MAX_MEMORY_MESSAGES, MEMORY_HISTORY_MESSAGES,
+    RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_SIMILARITY,
+    SUMMARY_CACHE_MAX_ENTRIES,
+)
+from backend.rate_limit import groq_call, groq_call_async
 from utils.embeddings import VectorStore
 from utils.chunker import DocumentChunk
 from tools.agent_tools import calculator_tool, table_generator_tool, comparison_tool, csv_export_tool
 
 
+# Groq clients are created on first use and shared by every session's agent, so
+# upload-only sessions never build an HTTP pool and chat sessions reuse one
+_groq_client: Optional[Groq] = None
+_async_groq_client: Optional[AsyncGroq] = None
+
+
+def _get_groq_client() -> Optional[Groq]:
+    global _groq_client
+    if _groq_client is None and GROQ_API_KEY:
+        _groq_client = Groq(api_key=GROQ_API_KEY)
+    return _groq_client
+
+
+def _get_async_groq_client() -> Optional[AsyncGroq]:
+    global _async_groq_client
+    if _async_groq_client is None and GROQ_API_KEY:
+        _async_groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+    return _async_groq_client
+
+
 @dataclass
 class ChatMessage:
     role: str  # "user", "assistant", "system"
@@ -26,6 +57,16 @@ class ChatMessage:
     metadata: dict = field(default_factory=dict)
 
 
+@dataclass
+class PreparedTurn:
+    """Everything a chat turn needs before the LLM call; `cached` is set when the cache answered it."""
+    messages: List[Dict] = field(default_factory=list)
+    key_suffix: str = ""
+    prompt_key: str = ""
+    query_vec: Optional[np.ndarray] = None
+    cached: Optional[str] = None
+
+
 class LexiSenseAgent:
     """
     Autonomous agent that decides how to handle user queries:
@@ -80,34 +121,90 @@ When you need to perform specific actions, indicate them in your reasoning:
 - Always ground your answers in the retrieved document chunks
 - If no documents are uploaded, tell the user to upload documents first"""
 
+    # Intent patterns, compiled once and fused into one alternation per category
+    _INTENT_RES = {
+        "calc": re.compile(
+            r'calculate|compute|what is \d|how much|total|sum of|average|percentage|difference between.*\d',
+            re.IGNORECASE,
+        ),
+        "comp": re.compile(
+            r'compare|difference|versus|vs\.?|file a.*file b|between.*and|contrast',
+            re.IGNORECASE,
+        ),
+        "table": re.compile(
+            r'table|list all|extract all|create a table|organize|structured|tabulate',
+            re.IGNORECASE,
+        ),
+        "export": re.compile(r'export|download|csv|save as', re.IGNORECASE),
+        # Queries that lean on the previous exchange ("why?", "tell me more about it")
+        "followup": re.compile(
+            r'^\W*(?:and|but|so|also|then|why|how come|what about|how about|go on)\b|'
+            r'\b(?:it|its|that|this|these|those|they|them|their|above|previous|earlier|'
+            r'more|else|again|same|elaborate|continue)\b',
+            re.IGNORECASE,
+        ),
+    }
+    _CALC_TOOLCALL_RE = re.compile(r'\[CALC:\s*(.+?)\]')
+
     def __init__(self, vector_store: VectorStore):
         self.vector_store = vector_store
-        self.memory: List[ChatMessage] = []
-        self.client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
-        self.async_client = AsyncGroq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
-        self.document_summaries: Dict[str, str] = {}
-
-    def _build_context(self, query: str, file_filter: Optional[str] = None) -> str:
-        """Retrieve relevant chunks and build context for the LLM."""
-        results = self.vector_store.hybrid_search(query, file_filter=file_filter)
-
+        # Ring buffer: keeps 2x the prompt window so the history view still has context
+        self.memory: Deque[ChatMessage] = deque(maxlen=MEMORY_HISTORY_MESSAGES)
+        # LRU of summaries keyed by "filename|content signature"
+        self.document_summaries: "OrderedDict[str, str]" = OrderedDict()
+        # Semantic response cache: prompt hash -> (query embedding or None, key suffix, answer, stored_at)
+        self._response_cache: "OrderedDict[str, Tuple[Optional[np.ndarray], str, str, float]]" = OrderedDict()
+        self._cache_version = vector_store.version
+
+    @property
+    def client(self) -> Optional[Groq]:
+        return _get_groq_client()
+
+    @property
+    def async_client(self) -> Optional[AsyncGroq]:
+        return _get_async_groq_client()
+
+    def _build_context(self, results: List[Tuple[DocumentChunk, float]]) -> str:
+        """Build context for the LLM from retrieved chunks."""
         if not results:
             return "No relevant information found in the uploaded documents."
 
-        context_parts = []
-        for chunk, score in results:
-            source = f"[Source: {chunk.filename}"
-            if chunk.page_info:
-                source += f", {chunk.page_info}"
-            source += f", Relevance: {score:.2f}]"
-            context_parts.append(f"{source}\n{chunk.content}")
-
-        return "\n\n---\n\n".join(context_parts)
-
-    def _detect_intent(self, query: str) -> Dict[str, Any]:
-        """Analyze the query to determine which tools/actions are needed."""
-        query_lower = query.lower()
-
+        return "\n\n---\n\n".join(
+            f"[Source: {chunk.filename}{f', {chunk.page_info}' if chunk.page_info else ''}, "
+            f"Relevance: {score:.2f}]\n{chunk.content}"
+            for chunk, score in results
+        )
+
+    @staticmethod
+    def _collect_comparison_text(chunks: List[DocumentChunk], exclude: set, max_chars: int = 2000) -> str:
+        """Join chunks up to `max_chars`, skipping ones already in the retrieved context."""
+        parts = []
+        remaining = max_chars
+        for c in chunks:
+            if remaining <= 0:
+                break
+            if (c.filename, c.chunk_index) in exclude:
+                continue
+            text = c.content[:remaining]
+            parts.append(text)
+            remaining -= len(text) + 1
+        return "\n".join(parts)
+
+    def _build_comparison_context(self, intent: Dict[str, Any], results: List[Tuple[DocumentChunk, float]]) -> str:
+        """Build the side-by-side comparison block when two files were named, else ''."""
+        if not (intent["needs_comparison"] and len(intent["comparison_files"]) >= 2):
+            return ""
+        file_a, file_b = intent["comparison_files"][:2]
+        retrieved = {(chunk.filename, chunk.chunk_index) for chunk, _ in results}
+        text_a = self._collect_comparison_text(self.vector_store.get_file_chunks(file_a), retrieved)
+        text_b = self._collect_comparison_text(self.vector_store.get_file_chunks(file_b), retrieved)
+        return comparison_tool(text_a, text_b, file_a, file_b)
+
+    def _detect_intent(self, query: str, files: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Analyze the query to determine which tools/actions are needed.
+        `files` is the turn's file list; it is only fetched when a comparison is detected.
+        """
         intent = {
             "needs_retrieval": True,
             "needs_calculation": False,
@@ -119,45 +216,38 @@ When you need to perform specific actions, indicate them in your reasoning:
         }
 
         # Detect calculation intent
-        calc_patterns = [
-            r'calculate', r'compute', r'what is \d', r'how much',
-            r'total', r'sum of', r'average', r'percentage', r'difference between.*\d',
-        ]
-        if any(re.search(p, query_lower) for p in calc_patterns):
+        if self._INTENT_RES["calc"].search(query):
             intent["needs_calculation"] = True
 
         # Detect comparison intent
-        comp_patterns = [
-            r'compare', r'difference', r'versus', r'vs\.?',
-            r'file a.*file b', r'between.*and', r'contrast',
-        ]
-        if any(re.search(p, query_lower) for p in comp_patterns):
+        if self._INTENT_RES["comp"].search(query):
             intent["needs_comparison"] = True
             # Try to extract file references
-            files = self.vector_store.get_files()
+            if files is None:
+                files = self.vector_store.get_files()
+            # Patterns are case-insensitive; only the filename match needs a lowered copy
+            query_lower = query.lower()
             mentioned = [f for f in files if f.lower() in query_lower]
             intent["comparison_files"] = mentioned[:2]
 
         # Detect table/structured output intent
-        table_patterns = [
-            r'table', r'list all', r'extract all', r'create a table',
-            r'organize', r'structured', r'tabulate',
-        ]
-        if any(re.search(p, query_lower) for p in table_patterns):
+        if self._INTENT_RES["table"].search(query):
             intent["needs_table"] = True
 
         # Detect export intent
-        if re.search(r'export|download|csv|save as', query_lower):
+        if self._INTENT_RES["export"].search(query):
             intent["needs_export"] = True
 
         return intent
 
-    def _build_messages(self, query: str, context: str, intent: Dict) -> List[Dict]:
+    def _build_messages(self, query: str, context: str, intent: Dict, files: List[str]) -> List[Dict]:
         """Build the message list for the LLM call."""
+        # The system prompt + memory head stays byte-identical across turns so the provider
+        # can reuse its prefix cache; all per-turn content goes in the tail message
         messages = [{"role": "system", "content": self.SYSTEM_PROMPT}]
 
         # Add recent memory (last N messages)
-        recent = self.memory[-MAX_MEMORY_MESSAGES:]
+        recent = itertools.islice(self.memory, max(0, len(self.memory) - MAX_MEMORY_MESSAGES), None)
         for msg in recent:
             messages.append({"role": msg.role, "content": msg.content})
 
@@ -165,7 +255,6 @@ When you need to perform specific actions, indicate them in your reasoning:
         user_message_parts = []
 
         # Add available files info
-        files = self.vector_store.get_files()
         if files:
             user_message_parts.append(f"**Available Documents:** {', '.join(files)}")
 
@@ -192,60 +281,155 @@ When you need to perform specific actions, indicate them in your reasoning:
         messages.append({"role": "user", "content": "\n".join(user_message_parts)})
         return messages
 
-    def _process_tool_calls(self, response_text: str) -> str:
-        """Process any tool calls embedded in the response."""
-        # Handle [CALC: ...] patterns
-        calc_matches = re.findall(r'\[CALC:\s*(.+?)\]', response_text)
-        for expr in calc_matches:
-            result = calculator_tool(expr)
-            response_text = response_text.replace(f"[CALC: {expr}]", f"**🧮 {result}**")
-
-        return response_text
+    def _cache_keys(self, query: str, file_filter: Optional[str],
+                    results: List[Tuple[DocumentChunk, float]]) -> Tuple[str, str]:
+        """
+        Build the (key_suffix, prompt_key) pair for the response cache.
+        Answers are only reused when the filter and retrieved chunks are identical, and for
+        follow-up questions also the prior conversation.
+        """
+        chunk_ids = sorted((chunk.filename, chunk.chunk_index) for chunk, _ in results)
+        key_suffix = f"{file_filter}|{hash(tuple(chunk_ids))}"
+        # A follow-up ("why?", "tell me more") depends on the exchange before it, so it must not get
+        # an answer given after a different one. Standalone questions stay shareable across turns.
+        # Memory already ends with the current query.
+        if len(query.split()) <= 3 or self._INTENT_RES["followup"].search(query):
+            n = len(self.memory)
+            history = itertools.islice(self.memory, max(0, n - MAX_MEMORY_MESSAGES), max(0, n - 1))
+            memory_digest = hashlib.sha256(
+                "\x1e".join(f"{m.role}:{m.content}" for m in history).encode("utf-8")
+            ).hexdigest()[:16]
+            key_suffix = f"{key_suffix}|{memory_digest}"
+        normalized = " ".join(query.lower().split())
+        prompt_key = hashlib.sha256(f"{normalized}|{key_suffix}".encode("utf-8")).hexdigest()
+        return key_suffix, prompt_key
+
+    def _cache_lookup(self, query_vec: Optional[np.ndarray], key_suffix: str, prompt_key: str) -> Optional[str]:
+        """Return a cached answer for an identical or near-identical query, if any."""
+        # Any change to the indexed documents invalidates every cached answer
+        if self._cache_version != self.vector_store.version:
+            self._response_cache.clear()
+            self._cache_version = self.vector_store.version
+
+        now = time.monotonic()
+        expired = [k for k, entry in self._response_cache.items() if now - entry[3] > RESPONSE_CACHE_TTL_SECONDS]
+        for k in expired:
+            del self._response_cache[k]
+
+        hit_key = prompt_key if prompt_key in self._response_cache else None
+        if hit_key is None and query_vec is not None and np.any(query_vec):
+            best = RESPONSE_CACHE_SIMILARITY
+            for k, (vec, suffix, _, _) in self._response_cache.items():
+                if suffix != key_suffix or vec is None:
+                    continue
+                sim = float(np.dot(vec, query_vec))
+                if sim >= best:
+                    best, hit_key = sim, k
+
+        if hit_key is None:
+            return None
+        self._response_cache.move_to_end(hit_key)
+        return self._response_cache[hit_key][2]
+
+    def _cache_store(self, query_vec: Optional[np.ndarray], key_suffix: str, prompt_key: str, answer: str):
+        self._response_cache[prompt_key] = (query_vec, key_suffix, answer, time.monotonic())
+        self._response_cache.move_to_end(prompt_key)
+        while len(self._response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            self._response_cache.popitem(last=False)
+
+    def _find_calculations(self, response_text: str) -> List[str]:
+        """Unique [CALC: ...] expressions in order of appearance."""
+        return list(dict.fromkeys(self._CALC_TOOLCALL_RE.findall(response_text)))
+
+    @staticmethod
+    def _run_calculations(exprs: List[str]) -> Dict[str, str]:
+        return {expr: calculator_tool(expr) for expr in exprs}
+
+    def _render_tool_calls(self, response_text: str, results: Dict[str, str]) -> str:
+        if not results:
+            return response_text
+        return self._CALC_TOOLCALL_RE.sub(lambda m: f"**🧮 {results[m.group(1)]}**", response_text)
 
-    def chat(self, query: str, file_filter: Optional[str] = None) -> str:
+    def _retrieve(self, query: str,
+                  file_filter: Optional[str]) -> Tuple[List[Tuple[DocumentChunk, float]], Optional[np.ndarray]]:
         """
-        Process a user query synchronously.
-        Returns the agent's response.
+        Hybrid search plus the query embedding for the response cache (the second is a cache hit).
+        With no results, search may not have embedded the query, so the cache falls back to exact matches.
         """
-        if not self.client:
-            return "⚠️ Groq API key not configured. Please set GROQ_API_KEY in your .env file."
+        results = self.vector_store.hybrid_search(query, file_filter=file_filter)
+        if not results:
+            return results, None
+        return results, self.vector_store.embed_query(query)
 
+    async def _calculate_async(self, response_text: str) -> Dict[str, str]:
+        """Evaluate every [CALC: ...] expression in one worker-thread dispatch."""
+        exprs = self._find_calculations(response_text)
+        if not exprs:
+            return {}
+        return await asyncio.to_thread(self._run_calculations, exprs)
+
+    async def _prepare_turn(self, query: str, file_filter: Optional[str] = None) -> PreparedTurn:
+        """
+        Record the user message, retrieve context and build the LLM messages for one turn.
+        Returns early with `cached` set when the response cache already has an answer.
+        """
         # Save user message
         self.memory.append(ChatMessage(role="user", content=query))
 
+        # File list is fetched once per turn and shared by intent detection and prompt building
+        files = self.vector_store.get_files()
+
         # Detect intent
-        intent = self._detect_intent(query)
+        intent = self._detect_intent(query, files)
 
-        # Build context from retrieval
-        context = self._build_context(query, file_filter=file_filter)
+        # Build context from retrieval (blocking HF embedding calls run on a worker thread)
+        results, query_vec = await asyncio.to_thread(self._retrieve, query, file_filter)
+        context = self._build_context(results)
+
+        # Serve repeat / paraphrased questions from the response cache
+        key_suffix, prompt_key = self._cache_keys(query, file_filter, results)
+        turn = PreparedTurn(key_suffix=key_suffix, prompt_key=prompt_key, query_vec=query_vec)
+        turn.cached = self._cache_lookup(query_vec, key_suffix, prompt_key)
+        if turn.cached is not None:
+            self.memory.append(ChatMessage(role="assistant", content=turn.cached))
+            return turn
 
         # Handle comparison
-        if intent["needs_comparison"] and len(intent["comparison_files"]) >= 2:
-            file_a, file_b = intent["comparison_files"][:2]
-            chunks_a = self.vector_store.get_file_chunks(file_a)
-            chunks_b = self.vector_store.get_file_chunks(file_b)
-            text_a = "\n".join(c.content for c in chunks_a[:5])
-            text_b = "\n".join(c.content for c in chunks_b[:5])
-            comparison_context = comparison_tool(text_a, text_b, file_a, file_b)
+        comparison_context = self._build_comparison_context(intent, results)
+        if comparison_context:
             context = comparison_context + "\n\n" + context
 
-        # Build messages
-        messages = self._build_messages(query, context, intent)
+        turn.messages = self._build_messages(query, context, intent, files)
+        return turn
+
+    async def chat_async(self, query: str, file_filter: Optional[str] = None) -> str:
+        """
+        Process a user query without streaming, using the async client.
+        Returns the agent's full response without blocking the event loop.
+        """
+        if not self.async_client:
+            return "⚠️ Groq API key not configured. Please set GROQ_API_KEY in your .env file."
+
+        turn = await self._prepare_turn(query, file_filter)
+        if turn.cached is not None:
+            return turn.cached
 
         try:
-            response = self.client.chat.completions.create(
+            response = await groq_call_async(
+                self.async_client.chat.completions.create,
                 model=LLM_MODEL,
-                messages=messages,
+                messages=turn.messages,
                 temperature=LLM_TEMPERATURE,
                 max_tokens=LLM_MAX_TOKENS,
             )
             answer = response.choices[0].message.content
 
             # Process embedded tool calls
-            answer = self._process_tool_calls(answer)
+            answer = self._render_tool_calls(answer, await self._calculate_async(answer))
 
             # Save assistant response
             self.memory.append(ChatMessage(role="assistant", content=answer))
+            self._cache_store(turn.query_vec, turn.key_suffix, turn.prompt_key, answer)
 
             return answer
 
@@ -263,55 +447,66 @@ When you need to perform specific actions, indicate them in your reasoning:
             yield "⚠️ Groq API key not configured. Please set GROQ_API_KEY in your .env file."
             return
 
-        # Save user message
-        self.memory.append(ChatMessage(role="user", content=query))
-
-        # Detect intent
-        intent = self._detect_intent(query)
-
-        # Build context
-        context = self._build_context(query, file_filter=file_filter)
-
-        # Handle comparison
-        if intent["needs_comparison"] and len(intent["comparison_files"]) >= 2:
-            file_a, file_b = intent["comparison_files"][:2]
-            chunks_a = self.vector_store.get_file_chunks(file_a)
-            chunks_b = self.vector_store.get_file_chunks(file_b)
-            text_a = "\n".join(c.content for c in chunks_a[:5])
-            text_b = "\n".join(c.content for c in chunks_b[:5])
-            comparison_context = comparison_tool(text_a, text_b, file_a, file_b)
-            context = comparison_context + "\n\n" + context
-
-        messages = self._build_messages(query, context, intent)
+        turn = await self._prepare_turn(query, file_filter)
+        if turn.cached is not None:
+            # Replay in slices to keep the same streaming contract as a live response
+            for i in range(0, len(turn.cached), 40):
+                yield turn.cached[i:i + 40]
+                await asyncio.sleep(0)
+            return
 
         try:
-            stream = await self.async_client.chat.completions.create(
+            stream = await groq_call_async(
+                self.async_client.chat.completions.create,
                 model=LLM_MODEL,
-                messages=messages,
+                messages=turn.messages,
                 temperature=LLM_TEMPERATURE,
                 max_tokens=LLM_MAX_TOKENS,
                 stream=True,
             )
 
-            full_response = ""
+            parts: List[str] = []
             async for chunk in stream:
                 if chunk.choices[0].delta.content:
                     text = chunk.choices[0].delta.content
-                    full_response += text
+                    parts.append(text)
                     yield text
+            full_response = "".join(parts)
 
-            # Process tool calls in complete response
-            processed = self._process_tool_calls(full_response)
-            if processed != full_response:
-                yield "\n\n" + processed.replace(full_response, "")
+            # The raw text is already streamed, so only append the rendered calculator results
+            tool_output = ""
+            calc_results = await self._calculate_async(full_response)
+            if calc_results:
+                tool_output = "\n\n" + "\n".join(f"**🧮 {result}**" for result in calc_results.values())
+                yield tool_output
 
             self.memory.append(ChatMessage(role="assistant", content=full_response))
+            self._cache_store(turn.query_vec, turn.key_suffix, turn.prompt_key, full_response + tool_output)
 
         except Exception as e:
             error_msg = f"\n\n⚠️ Error: {str(e)}"
             self.memory.append(ChatMessage(role="assistant", content=error_msg))
             yield error_msg
 
+    @staticmethod
+    def _summary_key(filename: str, chunks: List[DocumentChunk]) -> str:
+        """Key summaries on the content they were built from, so re-uploads with new content miss."""
+        content_sig = hashlib.blake2b(
+            b"".join(c.content.encode("utf-8") for c in chunks[:8]), digest_size=16
+        ).hexdigest()
+        return f"{filename}|{content_sig}"
+
+    def get_cached_summary(self, filename: str) -> Optional[str]:
+        """Return a previously generated summary for the file's current content, if any."""
+        chunks = self.vector_store.get_file_chunks(filename)
+        if not chunks:
+            return None
+        key = self._summary_key(filename, chunks)
+        summary = self.document_summaries.get(key)
+        if summary is not None:
+            self.document_summaries.move_to_end(key)
+        return summary
+
     def generate_summary(self, filename: str) -> str:
         """Generate an intelligent summary of a document."""
         chunks = self.vector_store.get_file_chunks(filename)
@@ -352,7 +547,8 @@ Be precise and factual. Only include information actually present in the documen
             return "⚠️ Groq API key not configured."
 
         try:
-            response = self.client.chat.completions.create(
+            response = groq_call(
+                self.client.chat.completions.create,
                 model=LLM_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a document analysis expert. Provide accurate, well-structured summaries."},
@@ -362,14 +558,19 @@ Be precise and factual. Only include information actually present in the documen
                 max_tokens=2048,
             )
             summary = response.choices[0].message.content
-            self.document_summaries[filename] = summary
+            key = self._summary_key(filename, chunks)
+            self.document_summaries[key] = summary
+            self.document_summaries.move_to_end(key)
+            while len(self.document_summaries) > SUMMARY_CACHE_MAX_ENTRIES:
+                self.document_summaries.popitem(last=False)
             return summary
         except Exception as e:
             return f"⚠️ Error generating summary: {str(e)}"
 
     def clear_memory(self):
         """Clear conversation memory."""
-        self.memory = []
+        self.memory.clear()
+        self._response_cache.clear()
 
     def get_memory_context(self) -> List[Dict]:
         """Get conversation history for display."""
@@ -10,15 +10,6 @@ load_dotenv()
 
 # ── Paths ──────────────────────────────────────────────────────────────
 BASE_DIR = Path(__file__).resolve().parent.parent
-# On Vercel, the filesystem is read-only except for /tmp
-if os.getenv("VERCEL"):
-    UPLOAD_DIR = Path("/tmp") / "uploads"
-else:
-    UPLOAD_DIR = BASE_DIR / "uploads"
-
-# Moved mkdir into the upload logic to prevent import-time errors on certain platforms
-def ensure_upload_dir():
-    UPLOAD_DIR.mkdir(exist_ok=True, parents=True)
 
 # ── API Keys ───────────────────────────────────────────────────────────
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
@@ -30,9 +21,25 @@ TRANSCRIPTION_MODEL = "whisper-large-v3"
 LLM_TEMPERATURE = 0.3
 LLM_MAX_TOKENS = 4096
 
+# ── Groq Rate Limiting ────────────────────────────────────────────────
+def _positive_int_env(name: str, default: int) -> int:
+    """Read an integer setting that must be at least 1 (a zero rate or limit would stall every call)."""
+    value = int(os.getenv(name, str(default)))
+    if value < 1:
+        raise ValueError(f"{name} must be at least 1, got {value}")
+    return value
+
+GROQ_RPM = _positive_int_env("GROQ_RPM", 30)
+GROQ_BURST = 10
+GROQ_MAX_CONCURRENCY = _positive_int_env("GROQ_MAX_CONCURRENCY", 8)
+GROQ_MAX_RETRIES = 5
+
 # ── Embedding Configuration ───────────────────────────────────────────
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 EMBEDDING_DIMENSION = 384
+# Storage precision for chunk embeddings: "float32" (default), "float16" (2x smaller)
+# or "int8" (4x smaller, per-row scale)
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32").lower()
 
 # ── Chunking Configuration ────────────────────────────────────────────
 CHUNK_SIZE = 600
@@ -42,10 +49,45 @@ CHUNK_OVERLAP = 100
 TOP_K_RESULTS = 8
 SEMANTIC_WEIGHT = 0.6
 KEYWORD_WEIGHT = 0.4
+# Keyword index backend: "numpy" (built-in) or "bm25s" (requires `pip install bm25s`;
+# falls back to the built-in index when the package is missing)
+BM25_BACKEND = os.getenv("BM25_BACKEND", "numpy").lower()
+# Approximate nearest-neighbour index for large sessions: "none" (exact NumPy scan) or
+# "faiss" (HNSW, requires `pip install faiss-cpu`). Engaged once a store holds ANN_MIN_CHUNKS
+# chunks; unfiltered searches then score only the ANN_CANDIDATES nearest rows semantically.
+ANN_BACKEND = os.getenv("ANN_BACKEND", "none").lower()
+ANN_MIN_CHUNKS = 5000
+ANN_CANDIDATES = 200
+HNSW_M = 32
+HNSW_EF_SEARCH = 256
+
+# ── Response Cache Configuration ──────────────────────────────────────
+RESPONSE_CACHE_TTL_SECONDS = 300
+RESPONSE_CACHE_MAX_ENTRIES = 128
+RESPONSE_CACHE_SIMILARITY = 0.95
+SUMMARY_CACHE_MAX_ENTRIES = 64
 
 # ── Session Configuration ─────────────────────────────────────────────
 MAX_MEMORY_MESSAGES = 15
+# Messages kept per session (the history view keeps 2x the prompt window)
+MEMORY_HISTORY_MESSAGES = MAX_MEMORY_MESSAGES * 2
 SESSION_TIMEOUT_MINUTES = 60
+# Optional Redis for cross-worker / restart-safe sessions (disabled when empty)
+REDIS_URL = os.getenv("REDIS_URL", "")
+
+# ── Parse Cache Configuration ─────────────────────────────────────────
+# In-memory LRU of parsed uploads, bounded by entries and by total text held
+PARSE_CACHE_MAX_ENTRIES = 256
+PARSE_CACHE_MAX_CHARS = 64 * 1024 * 1024
+# On-disk cache of Vision/Whisper results keyed by file content (CORTEX_DISABLE_PARSE_CACHE=1 turns it off)
+if os.getenv("VERCEL"):
+    PARSE_CACHE_DIR = Path("/tmp") / "cortex" / "parsed"
+else:
+    PARSE_CACHE_DIR = Path.home() / ".cache" / "cortex" / "parsed"
+PARSE_CACHE_DISABLED = os.getenv("CORTEX_DISABLE_PARSE_CACHE", "").lower() in ("1", "true", "yes")
+# Least recently used entries are pruned beyond either bound
+PARSE_CACHE_DIR_MAX_ENTRIES = 2048
+PARSE_CACHE_DIR_MAX_MB = 256
 
 # ── File Limits ────────────────────────────────────────────────────────
 MAX_FILE_SIZE_MB = 4.5 if os.getenv("VERCEL") else 25
@@ -0,0 +1,100 @@
+"""
+Cortex AI – Groq Rate Limiting
+Client-side throttling shared by every Groq completion call: a token bucket
+keeps us under the account's requests-per-minute ceiling, one semaphore caps
+in-flight requests across the sync and async paths, and 429s are retried with jittered exponential backoff.
+"""
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable
+
+from groq import RateLimitError
+
+from backend.config import GROQ_RPM, GROQ_BURST, GROQ_MAX_CONCURRENCY, GROQ_MAX_RETRIES
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate_per_minute`, holding at most `burst` tokens."""
+
+    def __init__(self, rate_per_minute: int, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        # Shared by the sync and async paths, so guard with a thread lock
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token if one is available, else return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while (wait := self._reserve()) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        while (wait := self._reserve()) > 0:
+            time.sleep(wait)
+
+
+GROQ_LIMITER = TokenBucket(rate_per_minute=GROQ_RPM, burst=GROQ_BURST)
+# One budget for worker-thread calls (parsing, summaries) and event-loop calls (chat)
+GROQ_SEM = threading.BoundedSemaphore(GROQ_MAX_CONCURRENCY)
+
+
+async def _acquire_groq_slot():
+    """Take a GROQ_SEM slot from the event loop without blocking it."""
+    if GROQ_SEM.acquire(blocking=False):
+        return
+    waiter = asyncio.ensure_future(asyncio.to_thread(GROQ_SEM.acquire))
+    try:
+        await asyncio.shield(waiter)
+    except asyncio.CancelledError:
+        # The worker thread still ends up holding a slot; give it back once it does
+        waiter.add_done_callback(lambda _: GROQ_SEM.release())
+        raise
+
+
+def _backoff(attempt: int) -> float:
+    return min(2 ** attempt, 30) * random.uniform(0.5, 1.0)
+
+
+async def groq_call_async(fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """
+    Await an AsyncGroq call under the shared limiter.
+    For streaming calls this guards stream creation, not consumption.
+    """
+    await _acquire_groq_slot()
+    try:
+        for attempt in range(GROQ_MAX_RETRIES):
+            await GROQ_LIMITER.acquire()
+            try:
+                return await fn(*args, **kwargs)
+            except RateLimitError:
+                if attempt == GROQ_MAX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+    finally:
+        GROQ_SEM.release()
+
+
+def groq_call(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a sync Groq call under the shared limiter."""
+    with GROQ_SEM:
+        for attempt in range(GROQ_MAX_RETRIES):
+            GROQ_LIMITER.acquire_sync()
+            try:
+                return fn(*args, **kwargs)
+            except RateLimitError:
+                if attempt == GROQ_MAX_RETRIES - 1:
+                    raise
+                time.sleep(_backoff(attempt))
@@ -3,24 +3,26 @@ Lexi-Sense FastAPI Server
 Main API server handling file uploads, chat, streaming, and document management.
 """
 import os
+import io
 import uuid
-import json
+import time
 import asyncio
 import logging
-from pathlib import Path
 from typing import Optional, Dict
 from datetime import datetime
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+import orjson
 
-from backend.config import UPLOAD_DIR, MAX_FILE_SIZE_MB
-from utils.file_parser import parse_file
+from backend.config import MAX_FILE_SIZE_MB
+from utils.file_parser import parse_bytes
 from utils.chunker import chunk_text
 from utils.embeddings import VectorStore
+from backend.session_store import load_session_state, persist_session, delete_session_state, SessionStoreError
 
 logger = logging.getLogger("cortex-ai")
 
@@ -31,6 +33,7 @@ app = FastAPI(
     title="Cortex AI API",
     description="Industry-Grade Multi-Modal Document Intelligence",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -45,26 +48,63 @@ app.add_middleware(
 sessions: Dict[str, dict] = {}
 
 
-def get_or_create_session(session_id: Optional[str] = None) -> dict:
-    """Get or create a user session with its own vector store and agent."""
-    if session_id and session_id in sessions:
-        return sessions[session_id]
-
-    sid = session_id or str(uuid.uuid4())
+def _new_session(sid: str, state: Optional[dict] = None) -> dict:
+    """Build a local session, optionally seeded with state restored from Redis."""
     vector_store = VectorStore()
-    
+
     # Lazy import to speed up startup
-    from backend.agent import LexiSenseAgent
+    from backend.agent import LexiSenseAgent, ChatMessage
     agent = LexiSenseAgent(vector_store)
 
-    sessions[sid] = {
+    session = {
         "id": sid,
         "vector_store": vector_store,
         "agent": agent,
         "files": {},
         "created_at": datetime.utcnow().isoformat(),
     }
-    return sessions[sid]
+    if state:
+        # Files are not restored: their chunks lived in another worker's vector store
+        session["created_at"] = state["meta"].get("created_at", session["created_at"])
+        agent.document_summaries.update(state["summaries"])
+        for m in state["memory"]:
+            agent.memory.append(ChatMessage(role=m["role"], content=m["content"], timestamp=m["timestamp"]))
+    sessions[sid] = session
+    return session
+
+
+async def get_session(session_id: str) -> Optional[dict]:
+    """Get an existing session, restoring it from Redis if this worker has not seen it."""
+    if session_id in sessions:
+        return sessions[session_id]
+    try:
+        state = await load_session_state(session_id)
+    except SessionStoreError:
+        # Don't treat an outage as "unknown": a fresh session would overwrite the stored one
+        raise HTTPException(status_code=503, detail="Session store unavailable, please retry")
+    return _new_session(session_id, state) if state else None
+
+
+async def get_or_create_session(session_id: Optional[str] = None) -> dict:
+    """Get or create a user session with its own vector store and agent."""
+    if session_id:
+        session = await get_session(session_id)
+        if session:
+            return session
+
+    session = _new_session(session_id or str(uuid.uuid4()))
+    persist_session(session, created=True)
+    return session
+
+
+def _messages_since(agent, last) -> list:
+    """Serialize the memory entries appended after `last` (the previous tail message)."""
+    new = []
+    for msg in reversed(agent.memory):
+        if msg is last:
+            break
+        new.append({"role": msg.role, "content": msg.content, "timestamp": msg.timestamp})
+    return new[::-1]
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -103,85 +143,132 @@ async def health_check():
 
 
 # ── File Upload ────────────────────────────────────────────────────────
+UPLOAD_READ_CHUNK_BYTES = 1 << 20  # 1 MiB
+_upload_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_upload_semaphore() -> asyncio.Semaphore:
+    """Cap concurrent parse/chunk workers; created lazily so it binds to the running loop."""
+    global _upload_semaphore
+    if _upload_semaphore is None:
+        _upload_semaphore = asyncio.Semaphore(os.cpu_count() or 4)
+    return _upload_semaphore
+
+
+def _process_one(content: bytes, filename: str) -> dict:
+    """Parse and chunk a single uploaded file. Runs in a worker thread."""
+    # Parse the document straight from memory
+    parsed = parse_bytes(content, filename)
+
+    # Chunk the content
+    chunks = chunk_text(
+        parsed.content,
+        filename=parsed.filename,
+        file_type=parsed.file_type,
+    )
+    return {"parsed": parsed, "chunks": chunks}
+
+
+async def _process_one_limited(content: bytes, filename: str) -> dict:
+    async with _get_upload_semaphore():
+        return await asyncio.to_thread(_process_one, content, filename)
+
+
 @app.post("/api/upload")
 async def upload_files(
     files: list[UploadFile] = File(...),
     session_id: str = Query(default=""),
 ):
     """Upload and process one or more documents."""
-    session = get_or_create_session(session_id or None)
-    results = []
-
-    for file in files:
-        ext = Path(file.filename).suffix.lower()
-
-        # Read and validate size
-        content = await file.read()
-        size_mb = len(content) / (1024 * 1024)
-        if size_mb > MAX_FILE_SIZE_MB:
-            results.append({
+    session = await get_or_create_session(session_id or None)
+    # One slot per uploaded file, so the response lists files in upload order
+    results: list = [None] * len(files)
+
+    # Read in bounded pieces and validate size as we go, so oversized uploads
+    # are rejected before they are ever fully buffered
+    accepted = []
+    limit = MAX_FILE_SIZE_MB * 1024 * 1024
+    for i, file in enumerate(files):
+        buf = io.BytesIO()
+        size = 0
+        while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+            size += len(chunk)
+            if size > limit:
+                buf = None
+                break
+            buf.write(chunk)
+        if buf is None:
+            results[i] = {
                 "filename": file.filename,
                 "status": "error",
-                "message": f"File too large ({size_mb:.1f}MB). Maximum: {MAX_FILE_SIZE_MB}MB",
-            })
+                "message": f"File too large (over {MAX_FILE_SIZE_MB}MB). Maximum: {MAX_FILE_SIZE_MB}MB",
+            }
             continue
-
-        # Ensure directory exists before saving
-        from backend.config import ensure_upload_dir
-        ensure_upload_dir()
-        
-        # Save file temporarily
-        file_path = UPLOAD_DIR / file.filename
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        try:
-            # Parse the document
-            parsed = parse_file(str(file_path))
-
-            # Chunk the content
-            chunks = chunk_text(
-                parsed.content,
-                filename=parsed.filename,
-                file_type=parsed.file_type,
-            )
-
-            # Add to vector store (embedding happens here)
-            session["vector_store"].add_chunks(chunks)
-
-            # Store file metadata
-            session["files"][file.filename] = {
-                "filename": file.filename,
-                "file_type": parsed.file_type,
-                "word_count": parsed.word_count,
-                "page_count": parsed.page_count,
-                "chunk_count": len(chunks),
-                "size_mb": round(size_mb, 2),
-                "uploaded_at": datetime.utcnow().isoformat(),
-                "metadata": parsed.metadata,
+        accepted.append((i, file.filename, buf.getvalue(), size / (1024 * 1024)))
+
+    # Parse and chunk all files concurrently, off the event loop
+    processed = await asyncio.gather(
+        *[_process_one_limited(content, filename) for _, filename, content, _ in accepted],
+        return_exceptions=True,
+    )
+
+    succeeded = []
+    for (i, filename, _, size_mb), outcome in zip(accepted, processed):
+        if isinstance(outcome, Exception):
+            logger.error(f"Upload error for {filename}: {outcome}")
+            results[i] = {
+                "filename": filename,
+                "status": "error",
+                "message": str(outcome),
             }
+            continue
+        succeeded.append((i, filename, size_mb, outcome["parsed"], outcome["chunks"]))
 
-            results.append({
-                "filename": file.filename,
-                "status": "success",
-                "file_type": parsed.file_type,
-                "word_count": parsed.word_count,
-                "page_count": parsed.page_count,
-                "chunk_count": len(chunks),
-                "size_mb": round(size_mb, 2),
-            })
-
-        except Exception as e:
-            logger.error(f"Upload error for {file.filename}: {e}")
-            results.append({
-                "filename": file.filename,
-                "status": "error",
-                "message": str(e),
-            })
-        finally:
-            # Clean up temp file
-            if file_path.exists():
-                os.remove(file_path)
+    vector_store = session["vector_store"]
+    try:
+        # Add to vector store in one batch (embedding happens here)
+        await asyncio.to_thread(vector_store.add_chunks, [c for *_, chunks in succeeded for c in chunks])
+    except Exception as e:
+        # add_chunks publishes all or nothing, so index file by file to find out which ones fail
+        logger.error(f"Batch indexing error, retrying per file: {e}")
+        indexed = []
+        for entry in succeeded:
+            i, filename = entry[0], entry[1]
+            try:
+                await asyncio.to_thread(vector_store.add_chunks, entry[4])
+            except Exception as file_error:
+                logger.error(f"Indexing error for {filename}: {file_error}")
+                results[i] = {
+                    "filename": filename,
+                    "status": "error",
+                    "message": str(file_error),
+                }
+                continue
+            indexed.append(entry)
+        succeeded = indexed
+
+    for i, filename, size_mb, parsed, chunks in succeeded:
+        # Store file metadata
+        session["files"][filename] = {
+            "filename": filename,
+            "file_type": parsed.file_type,
+            "word_count": parsed.word_count,
+            "page_count": parsed.page_count,
+            "chunk_count": len(chunks),
+            "size_mb": round(size_mb, 2),
+            "uploaded_at": datetime.utcnow().isoformat(),
+            "metadata": parsed.metadata,
+        }
+
+        results[i] = {
+            "filename": filename,
+            "status": "success",
+            "file_type": parsed.file_type,
+            "word_count": parsed.word_count,
+            "page_count": parsed.page_count,
+            "chunk_count": len(chunks),
+            "size_mb": round(size_mb, 2),
+        }
 
     return {
         "session_id": session["id"],
@@ -192,21 +279,45 @@ async def upload_files(
 
 
 # ── Chat ───────────────────────────────────────────────────────────────
+SSE_FLUSH_CHARS = 64
+SSE_FLUSH_SECONDS = 0.02
+
+
+def _sse(payload: dict) -> bytes:
+    """Frame a payload as a server-sent event."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Send a message to the agent."""
-    session = get_or_create_session(request.session_id or None)
+    session = await get_or_create_session(request.session_id or None)
     agent: LexiSenseAgent = session["agent"]
+    last_message = agent.memory[-1] if agent.memory else None
 
     if request.stream:
         async def stream_generator():
+            # Coalesce tokens into fewer, larger SSE events
+            buf = []
+            buf_len = 0
+            last_flush = time.monotonic()
+            error_text = None
             try:
                 async for chunk in agent.chat_stream(request.query, file_filter=request.file_filter):
-                    yield f"data: {json.dumps({'text': chunk})}\n\n"
+                    buf.append(chunk)
+                    buf_len += len(chunk)
+                    if buf_len >= SSE_FLUSH_CHARS or time.monotonic() - last_flush > SSE_FLUSH_SECONDS:
+                        yield _sse({'text': ''.join(buf)})
+                        buf, buf_len, last_flush = [], 0, time.monotonic()
             except Exception as e:
                 logger.error(f"Stream error: {e}")
-                yield f"data: {json.dumps({'text': f'⚠️ Error: {str(e)}'})}\n\n"
-            yield f"data: {json.dumps({'done': True, 'session_id': session['id']})}\n\n"
+                error_text = f"⚠️ Error: {str(e)}"
+            if buf:
+                yield _sse({'text': ''.join(buf)})
+            if error_text:
+                yield _sse({'text': error_text})
+            persist_session(session, new_messages=_messages_since(agent, last_message))
+            yield _sse({'done': True, 'session_id': session['id']})
 
         return StreamingResponse(
             stream_generator(),
@@ -218,7 +329,8 @@ async def chat(request: ChatRequest):
             },
         )
     else:
-        response = agent.chat(request.query, file_filter=request.file_filter)
+        response = await agent.chat_async(request.query, file_filter=request.file_filter)
+        persist_session(session, new_messages=_messages_since(agent, last_message))
         return ChatResponse(
             response=response,
             session_id=session["id"],
@@ -229,14 +341,18 @@ async def chat(request: ChatRequest):
 @app.post("/api/summary")
 async def get_summary(request: SummaryRequest):
     """Generate an AI summary of a specific document."""
-    session = get_or_create_session(request.session_id)
+    session = await get_or_create_session(request.session_id)
     agent: LexiSenseAgent = session["agent"]
 
     if request.filename not in session["files"]:
         raise HTTPException(status_code=404, detail=f"File '{request.filename}' not found in session")
 
     try:
-        summary = agent.generate_summary(request.filename)
+        summary = agent.get_cached_summary(request.filename)
+        if summary is None:
+            # generate_summary blocks on the sync Groq limiter (bucket waits, 429 backoff): keep it off the loop
+            summary = await asyncio.to_thread(agent.generate_summary, request.filename)
+            persist_session(session, summaries=True)
         return {
             "filename": request.filename,
             "summary": summary,
@@ -251,10 +367,10 @@ async def get_summary(request: SummaryRequest):
 @app.get("/api/session/{session_id}")
 async def get_session_info(session_id: str):
     """Get session information including uploaded files."""
-    if session_id not in sessions:
+    session = await get_session(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    session = sessions[session_id]
     return {
         "session_id": session["id"],
         "files": list(session["files"].values()),
@@ -268,10 +384,11 @@ async def get_session_info(session_id: str):
 @app.get("/api/history/{session_id}")
 async def get_chat_history(session_id: str):
     """Get conversation history for a session."""
-    if session_id not in sessions:
+    session = await get_session(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    agent: LexiSenseAgent = sessions[session_id]["agent"]
+    agent: LexiSenseAgent = session["agent"]
     return {"history": agent.get_memory_context(), "session_id": session_id}
 
 
@@ -283,6 +400,7 @@ async def clear_session(session_id: str):
         sessions[session_id]["vector_store"].clear()
         sessions[session_id]["agent"].clear_memory()
         del sessions[session_id]
+    await delete_session_state(session_id)
     return {"status": "cleared", "session_id": session_id}
 
 
@@ -290,10 +408,11 @@ async def clear_session(session_id: str):
 @app.get("/api/files/{session_id}")
 async def get_files(session_id: str):
     """Get list of uploaded files in a session."""
-    if session_id not in sessions:
+    session = await get_session(session_id)
+    if session is None:
         return {"files": []}
 
-    return {"files": list(sessions[session_id]["files"].values())}
+    return {"files": list(session["files"].values())}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+"""
+Cortex AI – Session Persistence
+Optional Redis backing for session metadata and chat memory so sessions survive
+restarts and can be picked up by any worker. Enabled by setting REDIS_URL.
+The in-process session dict stays the hot path; writes are issued behind the
+request (write-behind) and reads only happen when a session is not yet local.
+Vector stores are not persisted and remain per-worker, so neither is the file
+list: a restored session has no indexed documents and must not claim any.
+"""
+import json
+import asyncio
+import logging
+from typing import Optional, List
+
+from backend.config import REDIS_URL, SESSION_TIMEOUT_MINUTES, MEMORY_HISTORY_MESSAGES
+
+logger = logging.getLogger("cortex-ai")
+
+SESSION_TTL_SECONDS = SESSION_TIMEOUT_MINUTES * 60
+_PARTS = ("meta", "memory", "summaries")
+
+_redis = None
+_background_tasks: set = set()
+
+
+class SessionStoreError(Exception):
+    """Redis could not be reached, so a session's persisted state is unknown (not absent)."""
+
+
+def _get_redis():
+    """Lazily create the shared redis.asyncio client (None when Redis is disabled)."""
+    global _redis
+    if _redis is None and REDIS_URL:
+        import redis.asyncio as redis
+        _redis = redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def _key(sid: str, part: str) -> str:
+    return f"sess:{sid}:{part}"
+
+
+def _schedule(coro):
+    """Run a persistence coroutine without holding up the request."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def load_session_state(sid: str) -> Optional[dict]:
+    """
+    Fetch persisted state for a session, or None if Redis is off or the session is unknown.
+    Raises SessionStoreError when Redis fails, so callers don't mistake an outage for a new session.
+    """
+    r = _get_redis()
+    if r is None:
+        return None
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.get(_key(sid, "meta"))
+            pipe.lrange(_key(sid, "memory"), 0, -1)
+            pipe.get(_key(sid, "summaries"))
+            meta, memory, summaries = await pipe.execute()
+    except Exception as e:
+        logger.error(f"Session restore error for {sid}: {e}")
+        raise SessionStoreError(str(e)) from e
+    if meta is None:
+        return None
+    return {
+        "meta": json.loads(meta),
+        "memory": [json.loads(m) for m in memory],
+        "summaries": json.loads(summaries) if summaries else {},
+    }
+
+
+async def _write_session(sid: str, meta: dict, created: bool,
+                         summaries: Optional[dict], new_messages: List[dict]):
+    r = _get_redis()
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            if created:
+                # A new session starts clean, even if stray parts of a deleted one are left under its id
+                pipe.delete(*[_key(sid, part) for part in _PARTS])
+            # Later writes only refresh an existing session (XX), so one landing after a
+            # delete can't bring it back: without meta, leftovers are unloadable and expire
+            pipe.set(_key(sid, "meta"), json.dumps(meta), ex=SESSION_TTL_SECONDS, xx=not created)
+            if summaries is not None:
+                pipe.set(_key(sid, "summaries"), json.dumps(summaries), ex=SESSION_TTL_SECONDS)
+            if new_messages:
+                pipe.rpush(_key(sid, "memory"), *[json.dumps(m) for m in new_messages])
+                pipe.ltrim(_key(sid, "memory"), -MEMORY_HISTORY_MESSAGES, -1)
+            for part in _PARTS:
+                pipe.expire(_key(sid, part), SESSION_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Session persist error for {sid}: {e}")
+
+
+def persist_session(session: dict, new_messages: Optional[List[dict]] = None,
+                    summaries: bool = False, created: bool = False):
+    """Queue a write-behind update of a session's persisted state. No-op without Redis."""
+    if _get_redis() is None:
+        return
+    meta = {"id": session["id"], "created_at": session["created_at"]}
+    _schedule(_write_session(
+        session["id"],
+        meta,
+        created,
+        dict(session["agent"].document_summaries) if summaries else None,
+        new_messages or [],
+    ))
+
+
+async def delete_session_state(sid: str):
+    r = _get_redis()
+    if r is None:
+        return
+    try:
+        await r.delete(*[_key(sid, part) for part in _PARTS])
+    except Exception as e:
+        logger.error(f"Session delete error for {sid}: {e}")
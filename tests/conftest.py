@@ -0,0 +1,12 @@
+"""
+Shared pytest setup: make the repo root importable (backend/, utils/, tools/ are
+top-level packages, as the server imports them) and keep tests off the network.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# No paid API calls or on-disk parse cache from tests
+os.environ.setdefault("CORTEX_DISABLE_PARSE_CACHE", "1")
@@ -0,0 +1,72 @@
+"""The inverted-index BM25 against a direct Okapi BM25 computation, and incremental indexing."""
+import math
+import random
+import re
+
+import numpy as np
+import pytest
+
+from utils.embeddings import BM25, Bm25sIndex
+
+
+def _reference_scores(corpus, query, k1=1.5, b=0.75):
+    docs = [re.findall(r'\w+', d.lower()) for d in corpus]
+    avg_dl = sum(map(len, docs)) / max(len(docs), 1)
+    scores = [0.0] * len(docs)
+    for token in re.findall(r'\w+', query.lower()):
+        df = sum(token in d for d in docs)
+        if not df:
+            continue
+        idf = math.log((len(docs) - df + 0.5) / (df + 0.5) + 1)
+        for i, d in enumerate(docs):
+            tf = d.count(token)
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg_dl))
+    return np.array(scores)
+
+
+def _corpus(seed=1, size=50):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(60)]
+    return [" ".join(rng.choices(words, k=rng.randint(0, 80))) for _ in range(size)]
+
+
+QUERIES = ["w1 w2 w3", "w5 w5 w59", "zzz", "", "W7 w8"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_reference(query):
+    corpus = _corpus()
+    bm25 = BM25()
+    bm25.fit(corpus)
+    assert np.allclose(bm25.score(query), _reference_scores(corpus, query), rtol=1e-5, atol=1e-6)
+
+
+def test_incremental_add_matches_fit():
+    corpus = _corpus()
+    fitted = BM25()
+    fitted.fit(corpus)
+    incremental = BM25()
+    for batch in (corpus[:10], [], corpus[10:33], corpus[33:]):
+        incremental.add(batch)
+    for query in QUERIES:
+        assert np.allclose(incremental.score(query), fitted.score(query), rtol=1e-5, atol=1e-6)
+
+
+def test_refit_resets():
+    bm25 = BM25()
+    bm25.fit(["alpha beta", "gamma"])
+    bm25.fit(["delta"])
+    assert bm25.corpus_size == 1
+    assert bm25.score("alpha").tolist() == [0.0]
+
+
+def test_bm25s_incremental_add_matches_fit():
+    pytest.importorskip("bm25s")
+    corpus = [d or "w0" for d in _corpus(seed=2)]
+    fitted = Bm25sIndex()
+    fitted.fit(corpus)
+    incremental = Bm25sIndex()
+    for batch in (corpus[:7], corpus[7:30], corpus[30:]):
+        incremental.add(batch)
+    for query in ("w1 w2", "w5 w59 zzz", "zzz"):
+        assert np.allclose(incremental.score(query), fitted.score(query))
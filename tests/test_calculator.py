@@ -0,0 +1,49 @@
+"""calculator_tool: AST evaluation and the size guards on LLM-supplied expressions."""
+import time
+
+import pytest
+
+from tools.agent_tools import calculator_tool
+
+
+@pytest.mark.parametrize("expression,expected", [
+    ("2 + 3 * 4", "2 + 3 * 4 = 14"),
+    ("(1+2)*3", "(1+2)*3 = 9"),
+    ("2^10", "2^10 = 1,024"),
+    ("10/4", "10/4 = 2.5000"),
+    ("-3**3", "-3**3 = -27"),
+    ("7 // 2", "7 // 2 = 3"),
+    ("20% of 500", "20.0% of 500.0 = 100.00"),
+])
+def test_arithmetic(expression, expected):
+    assert calculator_tool(expression) == expected
+
+
+def test_percentage_change():
+    assert calculator_tool("change from 100 to 125") == "Change from 100.00 to 125.00 = +25.00%"
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "().__class__",
+    "[1, 2]",
+])
+def test_rejects_non_arithmetic(expression):
+    assert calculator_tool(expression).startswith("Could not compute")
+
+
+@pytest.mark.parametrize("expression", [
+    "2**100000",
+    "((9**999)**999)**999",
+    "9**999*9**999*9**999*9**999",
+    "(10**999)**999",
+])
+def test_bounds_huge_integers(expression):
+    start = time.perf_counter()
+    result = calculator_tool(expression)
+    assert result.startswith("Could not compute")
+    assert time.perf_counter() - start < 1.0
+
+
+def test_division_by_zero():
+    assert "division by zero" in calculator_tool("1/0")
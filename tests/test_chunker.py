@@ -0,0 +1,80 @@
+"""chunk_text against the original string-based algorithm (re-splits every flush)."""
+import random
+import re
+
+import pytest
+
+from utils.chunker import chunk_text
+
+
+def _reference_chunk_text(text, chunk_size, chunk_overlap):
+    """The pre-optimization chunker, kept minimal: (content, chunk_index, page_info) tuples."""
+    def page_of(s):
+        m = re.search(r'\[Page (\d+)\]', s)
+        return f"Page {m.group(1)}" if m else ""
+
+    def overlap(parts):
+        result, words = [], 0
+        for part in reversed(parts):
+            pw = len(part.split())
+            if words + pw > chunk_overlap and result:
+                break
+            result.insert(0, part)
+            words += pw
+        return result
+
+    chunks, parts = [], []
+
+    def flush():
+        content = "\n\n".join(parts)
+        chunks.append((content, len(chunks), page_of(content)))
+        return overlap(parts)
+
+    if not text.strip():
+        return []
+    for para in [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]:
+        para_words = len(para.split())
+        pieces = ([s.strip() for s in re.split(r'(?<=[.!?])\s+(?=[A-Z])', para) if s.strip()]
+                  if para_words > chunk_size else [para])
+        if para_words > chunk_size and parts:
+            parts = flush()
+        for piece in pieces:
+            if sum(len(p.split()) for p in parts) + len(piece.split()) > chunk_size and parts:
+                parts = flush()
+            parts.append(piece)
+    if parts:
+        flush()
+    return chunks
+
+
+def _random_document(rng):
+    def sentence():
+        words = " ".join(rng.choice(["alpha", "beta", "Gamma", "delta", "x1"]) for _ in range(rng.randint(3, 30)))
+        return words + rng.choice([".", "!", "?", ""])
+
+    paragraphs = []
+    for page in range(rng.randint(1, 40)):
+        para = " ".join(sentence().capitalize() for _ in range(rng.choice([1, 2, 5, 40, 120])))
+        paragraphs.append(f"[Page {page + 1}]\n{para}" if rng.random() < 0.2 else para)
+    return "\n\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(600, 100), (50, 10), (200, 0)])
+def test_matches_reference(chunk_size, chunk_overlap):
+    rng = random.Random(3)
+    for _ in range(30):
+        doc = _random_document(rng)
+        got = [(c.content, c.chunk_index, c.page_info) for c in chunk_text(doc, "f.txt", "txt", chunk_size, chunk_overlap)]
+        assert got == _reference_chunk_text(doc, chunk_size, chunk_overlap)
+
+
+def test_empty_text():
+    assert chunk_text("  \n\n ", "f.txt", "txt") == []
+
+
+def test_chunk_metadata():
+    chunks = chunk_text("[Page 2]\nHello there.\n\nMore text.", "doc.pdf", "pdf")
+    assert len(chunks) == 1
+    assert chunks[0].filename == "doc.pdf"
+    assert chunks[0].file_type == "pdf"
+    assert chunks[0].page_info == "Page 2"
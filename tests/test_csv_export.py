@@ -0,0 +1,50 @@
+"""csv_export_tool's join-based fast path against csv.DictWriter, which it replaces."""
+import csv
+import io
+
+import pytest
+
+from tools.agent_tools import csv_export_tool
+
+
+def _dictwriter(data):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(data[0].keys()))
+    writer.writeheader()
+    writer.writerows(data)
+    return output.getvalue()
+
+
+CASES = [
+    [{"name": "Alice", "amount": 500}, {"name": "Bob", "amount": 250.75}],
+    [{"text": 'He said "hi"', "note": "a,b"}, {"text": "line\nbreak", "note": "cr\rhere"}],
+    [{"a": None, "b": ""}, {"a": 0, "b": False}],
+    # Rows missing a header key get an empty cell
+    [{"a": 1, "b": 2, "c": 3}, {"a": 4}],
+    [{"x": "  padded  ", "y": "semi;colon", "z": "unicode café ☃"}],
+    [{"quote,key": 1, 'say "x"': 2}],
+]
+
+
+@pytest.mark.parametrize("data", CASES)
+def test_fast_path_matches_dictwriter(data):
+    assert csv_export_tool(data) == _dictwriter(data)
+
+
+@pytest.mark.parametrize("data", [
+    # DictWriter special cases handled by the fallback
+    [{"only": ""}, {"only": "value"}],
+    [{"a": 1, "b": 2}, {"a": 3, "b": 4, "extra": 5}],
+])
+def test_fallback_cases_keep_dictwriter_behavior(data):
+    try:
+        expected = _dictwriter(data)
+    except ValueError as e:
+        with pytest.raises(ValueError, match=str(e)):
+            csv_export_tool(data)
+    else:
+        assert csv_export_tool(data) == expected
+
+
+def test_empty():
+    assert csv_export_tool([]) == ""
@@ -0,0 +1,77 @@
+"""The raw-XML DOCX text extraction against python-docx's Paragraph.text / _Cell.text."""
+import io
+import random
+
+import pytest
+
+docx = pytest.importorskip("docx")
+from docx.enum.text import WD_BREAK
+from docx.oxml.ns import qn
+
+from utils.file_parser import _docx_cell_text, _docx_paragraph_text, parse_docx
+
+
+def _fill(paragraph, rng):
+    """Runs with tabs, line/page breaks, carriage returns, non-breaking hyphens and hyperlinks."""
+    for _ in range(rng.randint(0, 4)):
+        run = paragraph.add_run(rng.choice(["  lead", "trail  ", "a\tb", "x\ny", "", "plain"]))
+        roll = rng.random()
+        if roll < 0.2:
+            run.add_break()
+        elif roll < 0.3:
+            run.add_break(WD_BREAK.PAGE)
+        elif roll < 0.4:
+            run._r.append(run._r.makeelement(qn("w:noBreakHyphen"), {}))
+        elif roll < 0.5:
+            run._r.append(run._r.makeelement(qn("w:cr"), {}))
+    if rng.random() < 0.3:
+        link = paragraph._p.makeelement(qn("w:hyperlink"), {})
+        link.append(paragraph.add_run("link text")._r)
+        paragraph._p.append(link)
+
+
+def _random_document(rng):
+    doc = docx.Document()
+    for _ in range(rng.randint(0, 6)):
+        _fill(doc.add_paragraph(), rng)
+    for _ in range(rng.randint(0, 2)):
+        rows, cols = rng.randint(1, 3), rng.randint(1, 3)
+        table = doc.add_table(rows=rows, cols=cols)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = rng.choice(["a", " b ", "", "x\ty"])
+                if rng.random() < 0.3:
+                    _fill(cell.add_paragraph(), rng)
+        if cols > 1 and rng.random() < 0.3:
+            table.cell(0, 0).merge(table.cell(0, 1))
+        elif rows > 1 and rng.random() < 0.3:
+            table.cell(0, 0).merge(table.cell(1, 0))
+    return doc
+
+
+def test_paragraph_and_cell_text_match_python_docx():
+    rng = random.Random(3)
+    for _ in range(200):
+        doc = _random_document(rng)
+        for paragraph in doc.paragraphs:
+            assert _docx_paragraph_text(paragraph._p) == paragraph.text
+        for table in doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    assert _docx_cell_text(cell) == cell.text
+
+
+def test_parse_docx_from_bytes():
+    doc = docx.Document()
+    doc.add_paragraph("Hello\tworld")
+    doc.add_paragraph("")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = " a "
+    table.cell(0, 1).text = "b"
+    buf = io.BytesIO()
+    doc.save(buf)
+
+    parsed = parse_docx("report.docx", buf.getvalue())
+    assert parsed.filename == "report.docx"
+    assert "Hello\tworld" in parsed.content
+    assert "a | b" in parsed.content
@@ -0,0 +1,54 @@
+"""_image_info's PNG/JPEG/WebP header parsing against what Pillow reports for the same bytes."""
+import io
+
+import pytest
+
+from utils.file_parser import _image_info
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _encode(mode, size, fmt, **save_args):
+    buf = io.BytesIO()
+    Image.new(mode, size).save(buf, format=fmt, **save_args)
+    return buf.getvalue()
+
+
+def _pillow_info(raw):
+    img = Image.open(io.BytesIO(raw))
+    return img.size[0], img.size[1], img.format, img.mode
+
+
+CASES = [
+    ("L", (31, 17), "PNG", {}),
+    ("RGB", (640, 480), "PNG", {}),
+    ("RGBA", (1, 1), "PNG", {}),
+    ("LA", (5, 300), "PNG", {}),
+    ("P", (64, 64), "PNG", {}),
+    ("RGB", (800, 600), "JPEG", {}),
+    ("RGB", (123, 45), "JPEG", {"progressive": True}),
+    ("L", (10, 2000), "JPEG", {}),
+    ("CMYK", (50, 60), "JPEG", {}),
+    ("RGB", (300, 200), "WEBP", {}),
+    ("RGB", (16383, 1), "WEBP", {"lossless": True}),
+    ("RGBA", (77, 33), "WEBP", {}),
+    ("RGBA", (77, 33), "WEBP", {"lossless": True}),
+]
+
+
+@pytest.mark.parametrize("mode,size,fmt,save_args", CASES)
+def test_matches_pillow(mode, size, fmt, save_args):
+    raw = _encode(mode, size, fmt, **save_args)
+    assert _image_info(raw) == _pillow_info(raw)
+
+
+def test_other_formats_fall_back_to_pillow():
+    raw = _encode("RGB", (9, 7), "GIF")
+    assert _image_info(raw) == _pillow_info(raw)
+
+
+def test_truncated_header_falls_back_to_pillow():
+    raw = _encode("RGB", (40, 30), "PNG")
+    with pytest.raises(Exception):
+        # Too short for the IHDR chunk: the header parser gives up and Pillow reports the damage
+        _image_info(raw[:20])
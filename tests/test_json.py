@@ -0,0 +1,57 @@
+"""_format_json: the orjson fast path must print exactly what json.dumps(indent=2) does."""
+import json
+
+import pytest
+
+from utils import file_parser
+from utils.file_parser import _JSON_NUMBER_GUARD_RE, _format_json
+
+pytest.importorskip("orjson")
+
+
+def _stdlib(raw):
+    payload = json.loads(raw.decode("utf-8", errors="replace"))
+    return json.dumps(payload, indent=2, ensure_ascii=False), payload
+
+
+CASES = [
+    b'{"a": 1, "b": [true, false, null], "c": {"d": "text"}}',
+    b'[1, 2.5, -3, 0.1, 100.0, 3.14159]',
+    b'{"unicode": "caf\\u00e9 \\u2603", "raw": "na\xc3\xafve", "empty": {}, "list": []}',
+    b'{"escapes": "quote \\" backslash \\\\ newline \\n tab \\t"}',
+    # Numbers orjson reads or prints differently; the guard sends them to the stdlib path
+    b'{"big": 12345678901234567890}',
+    b'{"exp": 1e5, "neg": -2.5E-3}',
+    b'{"small": 0.00001}',
+    b'[123456789012345678]',
+    b'{"nan": NaN}',
+    b'{"bad utf8": "\xff\xfe"}',
+]
+
+
+@pytest.mark.parametrize("raw", CASES)
+def test_matches_stdlib_output(raw):
+    assert _format_json(raw) == _stdlib(raw)
+
+
+@pytest.mark.parametrize("raw, guarded", [
+    (b'{"id": 12345678901234567890}', True),
+    (b'[1e5]', True),
+    (b'{"x": 0.00001}', True),
+    (b'{"x": 1.5, "y": 42}', False),
+    # Digits inside strings don't trip the guard
+    (b'{"phone": "12345678901234567890", "v": "1e5"}', False),
+])
+def test_number_guard(raw, guarded):
+    assert bool(_JSON_NUMBER_GUARD_RE.search(raw)) is guarded
+
+
+def test_stdlib_fallback_without_orjson(monkeypatch):
+    monkeypatch.setattr(file_parser, "orjson", None)
+    raw = CASES[0]
+    assert _format_json(raw) == _stdlib(raw)
+
+
+def test_invalid_json_raises():
+    with pytest.raises(ValueError):
+        _format_json(b'{"a": }')
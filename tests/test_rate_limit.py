@@ -0,0 +1,160 @@
+"""groq_call / groq_call_async retry-with-backoff on 429s, and the token bucket."""
+import asyncio
+import threading
+
+import httpx
+import pytest
+from groq import RateLimitError
+
+from backend import config, rate_limit
+from backend.config import GROQ_MAX_RETRIES
+
+
+def _rate_limited():
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    return RateLimitError("rate limited", response=httpx.Response(429, request=request), body=None)
+
+
+class _Flaky:
+    """Raises a 429 for the first `failures` calls, then returns "ok"."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _rate_limited()
+        return "ok"
+
+
+@pytest.fixture
+def no_waiting(monkeypatch):
+    """Record backoff sleeps instead of sleeping, and never wait on the token bucket."""
+    sleeps = []
+
+    async def fake_async_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(rate_limit.time, "sleep", sleeps.append)
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", fake_async_sleep)
+    monkeypatch.setattr(rate_limit.GROQ_LIMITER, "_reserve", lambda: 0.0)
+    return sleeps
+
+
+def test_sync_retries_then_succeeds(no_waiting):
+    fn = _Flaky(failures=2)
+    assert rate_limit.groq_call(fn, model="m") == "ok"
+    assert fn.calls == 3
+    assert len(no_waiting) == 2
+
+
+def test_sync_gives_up_after_max_retries(no_waiting):
+    fn = _Flaky(failures=GROQ_MAX_RETRIES)
+    with pytest.raises(RateLimitError):
+        rate_limit.groq_call(fn)
+    assert fn.calls == GROQ_MAX_RETRIES
+    # No sleep after the final attempt
+    assert len(no_waiting) == GROQ_MAX_RETRIES - 1
+
+
+def test_sync_does_not_retry_other_errors(no_waiting):
+    def boom():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        rate_limit.groq_call(boom)
+    assert no_waiting == []
+
+
+def test_async_retries_then_succeeds(no_waiting):
+    fn = _Flaky(failures=1)
+
+    async def call(*args, **kwargs):
+        return fn(*args, **kwargs)
+
+    assert asyncio.run(rate_limit.groq_call_async(call)) == "ok"
+    assert fn.calls == 2
+    assert len(no_waiting) == 1
+
+
+def test_backoff_is_jittered_exponential_and_capped():
+    for attempt in range(8):
+        delay = rate_limit._backoff(attempt)
+        ceiling = min(2 ** attempt, 30)
+        assert ceiling * 0.5 <= delay <= ceiling
+
+
+def test_token_bucket_reserves_until_empty():
+    bucket = rate_limit.TokenBucket(rate_per_minute=60, burst=2)
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == 0.0
+    # Empty: the next token is about a second away at 1 token/s
+    assert 0.9 < bucket._reserve() <= 1.0
+
+
+def test_sync_and_async_calls_share_one_concurrency_budget(monkeypatch):
+    monkeypatch.setattr(rate_limit, "GROQ_SEM", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(rate_limit.GROQ_LIMITER, "_reserve", lambda: 0.0)
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def blocking_call():
+        started.release()
+        release.wait(5)
+        return "sync"
+
+    workers = [threading.Thread(target=rate_limit.groq_call, args=(blocking_call,)) for _ in range(2)]
+    for w in workers:
+        w.start()
+    for _ in workers:
+        assert started.acquire(timeout=5)
+
+    calls = []
+
+    async def async_call():
+        calls.append(1)
+        return "async"
+
+    async def run():
+        task = asyncio.create_task(rate_limit.groq_call_async(async_call))
+        await asyncio.sleep(0.1)
+        # Both slots are held by the worker threads
+        assert not task.done() and calls == []
+        release.set()
+        return await asyncio.wait_for(task, 5)
+
+    assert asyncio.run(run()) == "async"
+    for w in workers:
+        w.join(5)
+    # Every slot is back
+    assert all(rate_limit.GROQ_SEM.acquire(blocking=False) for _ in range(2))
+
+
+def test_cancelled_waiter_returns_its_slot(monkeypatch):
+    sem = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(rate_limit, "GROQ_SEM", sem)
+    sem.acquire()
+
+    async def run():
+        task = asyncio.create_task(rate_limit.groq_call_async(lambda: None))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The waiting worker thread gets the slot once it frees up, then hands it back
+        sem.release()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert sem.acquire(blocking=False)
+
+
+@pytest.mark.parametrize("value", ["0", "-3"])
+def test_rate_and_concurrency_settings_must_be_positive(monkeypatch, value):
+    monkeypatch.setenv("GROQ_RPM", value)
+    with pytest.raises(ValueError, match="GROQ_RPM must be at least 1"):
+        config._positive_int_env("GROQ_RPM", 30)
+    monkeypatch.setenv("GROQ_RPM", "12")
+    assert config._positive_int_env("GROQ_RPM", 30) == 12
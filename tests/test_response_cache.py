@@ -0,0 +1,136 @@
+"""LexiSenseAgent's response cache: exact and paraphrase hits, invalidation, TTL and follow-up keying."""
+import asyncio
+import re
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+from backend import agent as agent_module
+from backend.agent import LexiSenseAgent
+from backend.config import EMBEDDING_DIMENSION, RESPONSE_CACHE_TTL_SECONDS
+from utils.chunker import DocumentChunk
+from utils.embeddings import VectorStore
+
+_STOPWORDS = {"the", "a", "an"}
+
+
+class FakeEmbed:
+    """Same unit vector for texts with the same content words, so word-order paraphrases match."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIMENSION), np.float32)
+        keys = [" ".join(sorted(set(re.findall(r"\w+", t.lower())) - _STOPWORDS)) for t in texts]
+        rows = np.stack([np.random.default_rng(zlib.crc32(k.encode())).standard_normal(EMBEDDING_DIMENSION)
+                         for k in keys]).astype(np.float32)
+        return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        message = types.SimpleNamespace(content=f"answer {self.calls}")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    completions = FakeCompletions()
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    monkeypatch.setattr(agent_module, "_get_async_groq_client", lambda: client)
+    # Bypass rate limiting; the call is still awaited like the real one
+    monkeypatch.setattr(agent_module, "groq_call_async", lambda fn, *args, **kwargs: fn(*args, **kwargs))
+    return completions
+
+
+@pytest.fixture
+def embed(monkeypatch):
+    fake = FakeEmbed()
+    monkeypatch.setattr(VectorStore, "embed", lambda store, texts: fake(texts))
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(agent_module, "time", clock)
+    return clock
+
+
+def _agent(*texts):
+    store = VectorStore()
+    store.add_chunks([DocumentChunk(content=t, chunk_index=i, filename="report.txt", file_type="txt")
+                      for i, t in enumerate(texts)])
+    return LexiSenseAgent(store)
+
+
+def _ask(agent, *queries):
+    async def run():
+        return [await agent.chat_async(q) for q in queries]
+    return asyncio.run(run())
+
+
+def test_repeat_question_is_served_from_cache(llm, embed, clock):
+    agent = _agent("Revenue was 500 dollars in 2023.")
+    answers = _ask(agent, "What was the total revenue?", "what was  the TOTAL revenue?",
+                   "Total revenue was what?")
+    assert llm.calls == 1
+    assert answers == ["answer 1"] * 3
+    # Cached answers are still recorded in the conversation
+    assert [m.content for m in agent.memory if m.role == "assistant"] == ["answer 1"] * 3
+
+
+def test_new_documents_invalidate_cached_answers(llm, embed, clock):
+    agent = _agent("Revenue was 500 dollars in 2023.")
+    _ask(agent, "What was the total revenue?")
+    agent.vector_store.add_chunks([DocumentChunk(content="Revenue grew to 900 dollars in 2024.",
+                                                 chunk_index=0, filename="update.txt", file_type="txt")])
+    _ask(agent, "What was the total revenue?")
+    assert llm.calls == 2
+
+
+def test_entries_expire_after_ttl(llm, embed, clock):
+    agent = _agent("Revenue was 500 dollars in 2023.")
+    _ask(agent, "What was the total revenue?")
+    clock.now += RESPONSE_CACHE_TTL_SECONDS - 1
+    _ask(agent, "What was the total revenue?")
+    assert llm.calls == 1
+    clock.now += RESPONSE_CACHE_TTL_SECONDS + 1
+    _ask(agent, "What was the total revenue?")
+    assert llm.calls == 2
+
+
+def test_follow_ups_are_keyed_on_the_conversation(llm, embed, clock):
+    agent = _agent("Revenue was 500 dollars in 2023.", "Costs were 200 dollars in 2023.")
+    _ask(agent, "What was the total revenue?", "Why?")
+    assert llm.calls == 2
+    # Same follow-up after a different exchange must not reuse the earlier answer
+    _ask(agent, "What were the costs?", "Why?")
+    assert llm.calls == 4
+    # Standalone questions still hit across turns
+    _ask(agent, "What was the total revenue?")
+    assert llm.calls == 4
+
+
+def test_no_query_embedding_without_search_results(llm, embed, clock):
+    agent = LexiSenseAgent(VectorStore())
+    _ask(agent, "What was the total revenue?", "What was the total revenue?")
+    assert embed.calls == 0
+    assert llm.calls == 1
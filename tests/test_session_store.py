@@ -0,0 +1,100 @@
+"""Redis write-behind persistence of sessions (backend.session_store), against fakeredis."""
+import asyncio
+import types
+
+import pytest
+
+from backend import session_store
+from backend.config import MEMORY_HISTORY_MESSAGES
+from backend.session_store import (
+    SESSION_TTL_SECONDS, SessionStoreError, delete_session_state, load_session_state, persist_session,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(session_store, "_redis", client)
+    return client
+
+
+def _session(sid="s1", summaries=None):
+    agent = types.SimpleNamespace(document_summaries=summaries or {})
+    return {"id": sid, "created_at": "2026-01-01T00:00:00", "agent": agent}
+
+
+def _message(i):
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+
+
+async def _flush():
+    """Wait for every queued write-behind task."""
+    while session_store._background_tasks:
+        await asyncio.gather(*list(session_store._background_tasks))
+
+
+def test_writes_are_queued_behind_the_request(redis):
+    async def run():
+        session = _session(summaries={"a.txt|sig": "A summary"})
+        persist_session(session, created=True)
+        # Nothing has been written yet: the write runs after the caller yields
+        assert await redis.get("sess:s1:meta") is None
+        await _flush()
+        persist_session(session, new_messages=[_message(0), _message(1)], summaries=True)
+        await _flush()
+        return await load_session_state("s1"), await redis.ttl("sess:s1:memory")
+
+    state, ttl = asyncio.run(run())
+    assert state["meta"] == {"id": "s1", "created_at": "2026-01-01T00:00:00"}
+    assert state["memory"] == [_message(0), _message(1)]
+    assert state["summaries"] == {"a.txt|sig": "A summary"}
+    assert 0 < ttl <= SESSION_TTL_SECONDS
+
+
+def test_memory_is_trimmed_to_the_history_window(redis):
+    async def run():
+        persist_session(_session(), created=True)
+        for i in range(MEMORY_HISTORY_MESSAGES + 6):
+            persist_session(_session(), new_messages=[_message(i)])
+        await _flush()
+        return await load_session_state("s1")
+
+    memory = asyncio.run(run())["memory"]
+    assert len(memory) == MEMORY_HISTORY_MESSAGES
+    assert memory[-1] == _message(MEMORY_HISTORY_MESSAGES + 5)
+
+
+def test_late_write_does_not_resurrect_a_deleted_session(redis):
+    async def run():
+        persist_session(_session(), created=True)
+        await _flush()
+        await delete_session_state("s1")
+        persist_session(_session(), new_messages=[_message(0)])
+        await _flush()
+        return await load_session_state("s1")
+
+    assert asyncio.run(run()) is None
+
+
+def test_new_session_starts_clean(redis):
+    async def run():
+        await redis.rpush("sess:s1:memory", '{"role": "user", "content": "stale"}')
+        persist_session(_session(), created=True)
+        await _flush()
+        return await load_session_state("s1")
+
+    assert asyncio.run(run())["memory"] == []
+
+
+def test_unknown_session_and_redis_outage(redis, monkeypatch):
+    assert asyncio.run(load_session_state("nope")) is None
+
+    class Down:
+        def pipeline(self, **kwargs):
+            raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(session_store, "_redis", Down())
+    with pytest.raises(SessionStoreError):
+        asyncio.run(load_session_state("s1"))
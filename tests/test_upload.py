@@ -0,0 +1,80 @@
+"""/api/upload: per-file outcomes, reported in upload order."""
+import time
+import zlib
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import server
+from backend.config import EMBEDDING_DIMENSION, MAX_FILE_SIZE_MB
+from utils.embeddings import VectorStore
+from utils.file_parser import parse_bytes
+
+
+def _fake_embed(self, texts):
+    """Deterministic unit vectors; any text containing POISON fails like an HF outage would."""
+    if any("POISON" in t for t in texts):
+        raise RuntimeError("embedding failed")
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIMENSION), np.float32)
+    rows = np.stack([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(EMBEDDING_DIMENSION)
+                     for t in texts]).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _parse(content, filename):
+    if filename.startswith("broken"):
+        raise ValueError("cannot parse")
+    if filename.startswith("slow"):
+        time.sleep(0.2)
+    return parse_bytes(content, filename)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(VectorStore, "embed", _fake_embed)
+    monkeypatch.setattr(server, "parse_bytes", _parse)
+    monkeypatch.setattr(server, "_upload_semaphore", None)
+    server.sessions.clear()
+    with TestClient(server.app) as c:
+        yield c
+    server.sessions.clear()
+
+
+def _upload(client, names_and_bodies):
+    files = [("files", (name, body, "text/plain")) for name, body in names_and_bodies]
+    response = client.post("/api/upload", files=files)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_results_follow_upload_order(client):
+    too_big = b"x" * (MAX_FILE_SIZE_MB * 1024 * 1024 + 1)
+    body = _upload(client, [
+        ("slow.txt", b"Parsed last but listed first."),
+        ("broken.txt", b"never parsed"),
+        ("big.txt", too_big),
+        ("fast.txt", b"Parsed first."),
+    ])
+
+    assert [r["filename"] for r in body["results"]] == ["slow.txt", "broken.txt", "big.txt", "fast.txt"]
+    assert [r["status"] for r in body["results"]] == ["success", "error", "error", "success"]
+    assert body["results"][1]["message"] == "cannot parse"
+    assert body["total_files"] == 2
+
+
+def test_indexing_failure_only_fails_that_file(client):
+    body = _upload(client, [
+        ("good.txt", b"Revenue was 500 dollars."),
+        ("poison.txt", b"POISON in every chunk."),
+        ("also_good.txt", b"Costs were 200 dollars."),
+    ])
+
+    assert [(r["filename"], r["status"]) for r in body["results"]] == [
+        ("good.txt", "success"), ("poison.txt", "error"), ("also_good.txt", "success"),
+    ]
+    assert body["results"][1]["message"] == "embedding failed"
+    store = server.sessions[body["session_id"]]["vector_store"]
+    assert set(store.get_files()) == {"good.txt", "also_good.txt"}
+    assert body["total_chunks"] == len(store.chunks) == store.embeddings.shape[0]
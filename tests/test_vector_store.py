@@ -0,0 +1,93 @@
+"""VectorStore.hybrid_search: file-filter pushdown, reduced-precision storage and the ANN path."""
+import zlib
+
+import numpy as np
+import pytest
+
+from backend.config import EMBEDDING_DIMENSION
+from utils import embeddings
+from utils.chunker import DocumentChunk
+from utils.embeddings import VectorStore
+
+
+def _fake_embed(self, texts):
+    """Deterministic unit vectors per text, so a query equal to a chunk's text is its nearest row."""
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIMENSION), np.float32)
+    rows = np.stack([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(EMBEDDING_DIMENSION)
+                     for t in texts]).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(VectorStore, "embed", _fake_embed)
+
+
+def _chunks(filename, n, start=0):
+    return [DocumentChunk(content=f"{filename} section {i} mentions item{i} and the budget",
+                          chunk_index=i, filename=filename, file_type="txt") for i in range(start, start + n)]
+
+
+def _store(*batches):
+    store = VectorStore()
+    for batch in batches:
+        store.add_chunks(batch)
+    return store
+
+
+def test_file_filter_only_scores_that_file():
+    store = _store(_chunks("a.txt", 20), _chunks("b.txt", 20), _chunks("a.txt", 5, start=20))
+
+    results = store.hybrid_search("budget", top_k=50, file_filter="a.txt")
+    assert results
+    assert {c.filename for c, _ in results} == {"a.txt"}
+    # Rows from both a.txt uploads are candidates
+    assert store.hybrid_search("item17", top_k=1, file_filter="a.txt")[0][0].chunk_index == 17
+    assert store.hybrid_search("item22", top_k=1, file_filter="a.txt")[0][0].chunk_index == 22
+
+    # The exact text of a b.txt chunk is still found first once the filter allows it
+    query = store.chunks[30].content
+    assert store.hybrid_search(query, top_k=1, file_filter="b.txt")[0][0] is store.chunks[30]
+    assert store.hybrid_search(query, top_k=1, file_filter="a.txt")[0][0].filename == "a.txt"
+    assert store.hybrid_search(query, file_filter="missing.txt") == []
+
+
+@pytest.mark.parametrize("dtype, stored", [("float32", np.float32), ("float16", np.float16), ("int8", np.int8)])
+def test_reduced_precision_storage_ranks_like_float32(monkeypatch, dtype, stored):
+    batches = (_chunks("a.txt", 30), _chunks("b.txt", 30))
+    reference = _store(*batches)
+    monkeypatch.setattr(embeddings, "EMBEDDING_DTYPE", dtype)
+    store = _store(*batches)
+
+    assert store.embeddings.dtype == stored
+    assert (store._emb_scales is not None) == (dtype == "int8")
+    query = _fake_embed(None, ["what is the budget"])[0]
+    np.testing.assert_allclose(store._semantic_scores(query), reference._semantic_scores(query), atol=0.02)
+    np.testing.assert_allclose(store._semantic_scores(query, np.arange(30, 60)),
+                               reference._semantic_scores(query)[30:], atol=0.02)
+    for row in (0, 17, 42):
+        assert store.hybrid_search(store.chunks[row].content, top_k=1)[0][0] is store.chunks[row]
+
+
+def test_ann_path_matches_exact_search(monkeypatch):
+    pytest.importorskip("faiss")
+    batches = (_chunks("a.txt", 80), _chunks("b.txt", 40))
+    exact = _store(*batches)
+    monkeypatch.setattr(embeddings, "ANN_BACKEND", "faiss")
+    monkeypatch.setattr(embeddings, "ANN_MIN_CHUNKS", 100)
+    store = _store(batches[0])
+    assert store._ann is None  # below ANN_MIN_CHUNKS
+    store.add_chunks(batches[1])
+    assert store._ann is not None and store._ann.ntotal == 120
+
+    for row in (3, 77, 100, 119):
+        query = store.chunks[row].content
+        assert store.hybrid_search(query, top_k=1)[0][0] is store.chunks[row]
+        assert [c.chunk_index for c, _ in store.hybrid_search(query, top_k=3)] == \
+               [c.chunk_index for c, _ in exact.hybrid_search(query, top_k=3)]
+    # Filtered searches bypass the ANN index and score the file's rows exactly
+    assert {c.filename for c, _ in store.hybrid_search("budget", top_k=50, file_filter="b.txt")} == {"b.txt"}
+
+    store.clear()
+    assert store._ann is None
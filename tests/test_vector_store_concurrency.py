@@ -0,0 +1,74 @@
+"""VectorStore under concurrent uploads and searches (both run on worker threads in the server)."""
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from backend.config import EMBEDDING_DIMENSION
+from utils.chunker import DocumentChunk
+from utils.embeddings import VectorStore
+
+
+def _fake_embed(delay=0.0):
+    """Deterministic unit vectors per text; `delay` stands in for the HF round-trip."""
+    def embed(texts):
+        time.sleep(delay)
+        rows = np.stack([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(EMBEDDING_DIMENSION)
+                         for t in texts]).astype(np.float32) if texts else np.zeros((0, EMBEDDING_DIMENSION), np.float32)
+        return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    return embed
+
+
+def _chunks(filename, n):
+    return [DocumentChunk(content=f"{filename} chunk {i} revenue word{i}", chunk_index=i,
+                          filename=filename, file_type="txt") for i in range(n)]
+
+
+def _assert_consistent(store):
+    n = len(store.chunks)
+    assert store.embeddings.shape[0] == n
+    assert store.bm25.corpus_size == n
+    for filename, rows in store.file_index.items():
+        assert all(store.chunks[r].filename == filename for r in rows)
+    assert sum(len(rows) for rows in store.file_index.values()) == n
+
+
+def test_search_during_slow_upload():
+    store = VectorStore()
+    store.embed = _fake_embed()
+    store.add_chunks(_chunks("a.txt", 5))
+    store.embed = _fake_embed(delay=0.3)
+
+    upload = threading.Thread(target=store.add_chunks, args=(_chunks("b.txt", 5),))
+    upload.start()
+    errors = []
+    while upload.is_alive():
+        try:
+            results = store.hybrid_search("revenue word3")
+            assert {c.filename for c, _ in results} <= {"a.txt", "b.txt"}
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+            break
+    upload.join()
+
+    assert errors == []
+    _assert_consistent(store)
+    assert {c.filename for c, _ in store.hybrid_search("revenue", file_filter="b.txt")} == {"b.txt"}
+
+
+def test_concurrent_uploads_keep_rows_aligned():
+    store = VectorStore()
+    store.embed = _fake_embed(delay=0.05)
+    threads = [threading.Thread(target=store.add_chunks, args=(_chunks(f"f{i}.txt", 4),)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.total_chunks == 24
+    _assert_consistent(store)
+    # Every chunk is found by its own text, under the file it was uploaded with
+    for filename in store.get_files():
+        top, _ = store.hybrid_search(f"{filename} chunk 2 revenue word2", top_k=1)[0]
+        assert top.filename == filename
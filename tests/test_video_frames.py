@@ -0,0 +1,65 @@
+"""Splitting the batched Vision answer into per-frame descriptions, and the per-frame fallback."""
+import types
+
+import pytest
+
+from utils import file_parser
+from utils.file_parser import _describe_frames, _split_frame_answer
+
+
+@pytest.mark.parametrize("answer, n, expected", [
+    ("Frame 1: A title card.\nFrame 2: A person at a desk.", 2, ["A title card.", "A person at a desk."]),
+    # Markdown decoration, other separators, multi-line bodies and a preamble
+    ("Here you go:\n**Frame 1:** A chart.\nIt shows growth.\n\n## Frame 2 - Closing slide",
+     2, ["A chart.\nIt shows growth.", "Closing slide"]),
+    ("frame 2) Second.\nframe 1. First.", 2, ["First.", "Second."]),
+    # First description of a repeated frame number wins
+    ("Frame 1: One.\nFrame 1: Again.\nFrame 2: Two.", 2, ["One.", "Two."]),
+])
+def test_split(answer, n, expected):
+    assert _split_frame_answer(answer, n) == expected
+
+
+@pytest.mark.parametrize("answer, n", [
+    ("Frame 1: Only one.", 2),
+    ("Frame 1: One.\nFrame 2:\nFrame 3: Three.", 3),  # empty body
+    ("Frame 1: One.\nFrame 3: Out of range.", 2),
+    ("A single paragraph describing everything.", 2),
+])
+def test_split_incomplete_answers(answer, n):
+    assert _split_frame_answer(answer, n) is None
+
+
+class _FakeVision:
+    """Answers the batched request with `batch_answer` and single-frame requests with "single"."""
+
+    def __init__(self, batch_answer):
+        self.batch_answer = batch_answer
+        self.calls = []
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, messages, **kwargs):
+        images = sum(part["type"] == "image_url" for part in messages[0]["content"])
+        self.calls.append(images)
+        content = self.batch_answer if images > 1 else "single"
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(file_parser, "groq_call", lambda fn, *args, **kwargs: fn(*args, **kwargs))
+
+
+FRAMES = [(0.0, "aaa"), (2.5, "bbb"), (5.0, "ccc")]
+
+
+def test_describe_frames_in_one_request():
+    client = _FakeVision("Frame 1: Intro.\nFrame 2: Chart.\nFrame 3: Outro.")
+    assert _describe_frames(client, FRAMES) == ["[@0.00s]: Intro.", "[@2.50s]: Chart.", "[@5.00s]: Outro."]
+    assert client.calls == [3]
+
+
+def test_describe_frames_falls_back_per_frame():
+    client = _FakeVision("Frame 1: Intro.\nFrame 2: Chart.")
+    assert _describe_frames(client, FRAMES) == ["[@0.00s]: single", "[@2.50s]: single", "[@5.00s]: single"]
+    assert client.calls == [3, 1, 1, 1]
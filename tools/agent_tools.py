@@ -4,26 +4,79 @@ Specialized tools the AI agent can invoke for calculations, table generation,
 document comparison, and CSV export.
 """
 import re
+import ast
 import json
 import csv
 import io
+import functools
+import math
+import operator
 from typing import List, Dict, Any, Optional
 
+_CSV_QUOTE_RE = re.compile(r'[,"\r\n]')
+_PCT_RE = re.compile(r'([\d.]+)%\s*of\s*([\d.]+)')
+_CHANGE_RE = re.compile(r'.*?from\s*([\d,.]+)\s*to\s*([\d,.]+)', re.IGNORECASE)
+_SANITIZE_RE = re.compile(r'[^\d+\-*/().%\s]')
+
 
 # ═══════════════════════════════════════════════════════════════════════
 #  CALCULATOR TOOL
 # ═══════════════════════════════════════════════════════════════════════
+_CALC_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_CALC_UNARYOPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_CALC_MAX_EXPONENT = 1000
+# Integers are exact and unbounded in Python, so cap every intermediate (~1200 digits)
+_CALC_MAX_INT_BITS = 4096
+
+
+def _check_int_size(value):
+    if isinstance(value, int) and value.bit_length() > _CALC_MAX_INT_BITS:
+        raise ValueError("result too large")
+    return value
+
+
+def _eval_arithmetic(node: ast.AST):
+    """Evaluate a parsed arithmetic expression, rejecting anything but numbers and operators."""
+    if isinstance(node, ast.Expression):
+        return _eval_arithmetic(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return _check_int_size(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _CALC_BINOPS:
+        left = _eval_arithmetic(node.left)
+        right = _eval_arithmetic(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > _CALC_MAX_EXPONENT:
+                raise ValueError("exponent too large")
+            # Estimate the size before computing: an exact int power is the expensive case
+            if (isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1
+                    and right * math.log2(abs(left)) > _CALC_MAX_INT_BITS):
+                raise ValueError("result too large")
+        return _check_int_size(_CALC_BINOPS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _CALC_UNARYOPS:
+        return _CALC_UNARYOPS[type(node.op)](_eval_arithmetic(node.operand))
+    raise ValueError(f"unsupported syntax: {type(node).__name__}")
+
+
+@functools.lru_cache(maxsize=1024)
 def calculator_tool(expression: str) -> str:
     """
     Safely evaluate a mathematical expression.
     Supports basic arithmetic, percentages, and common math functions.
     """
     # Sanitize input
-    allowed_chars = set("0123456789+-*/().%, ")
     clean = expression.replace("^", "**").replace("×", "*").replace("÷", "/")
 
     # Handle percentages like "20% of 500"
-    pct_match = re.match(r'([\d.]+)%\s*of\s*([\d.]+)', clean)
+    # Cheap substring checks skip the regexes for plain arithmetic
+    pct_match = _PCT_RE.match(clean) if "%" in clean else None
     if pct_match:
         pct = float(pct_match.group(1))
         base = float(pct_match.group(2))
@@ -31,19 +84,19 @@ def calculator_tool(expression: str) -> str:
         return f"{pct}% of {base} = {result:,.2f}"
 
     # Handle percentage change "from X to Y"
-    change_match = re.match(r'.*?from\s*([\d,.]+)\s*to\s*([\d,.]+)', expression, re.IGNORECASE)
+    change_match = _CHANGE_RE.match(expression) if "from" in expression.lower() else None
     if change_match:
         old = float(change_match.group(1).replace(",", ""))
         new = float(change_match.group(2).replace(",", ""))
         change = ((new - old) / old) * 100
         return f"Change from {old:,.2f} to {new:,.2f} = {change:+.2f}%"
 
-    # Clean for eval
-    clean = re.sub(r'[^\d+\-*/().%\s]', '', clean)
+    # Strip to arithmetic and evaluate the AST directly (no eval)
+    clean = _SANITIZE_RE.sub('', clean)
     clean = clean.replace("%", "/100")
 
     try:
-        result = eval(clean, {"__builtins__": {}}, {})
+        result = _eval_arithmetic(ast.parse(clean.strip(), mode="eval"))
         return f"{expression} = {result:,.4f}" if isinstance(result, float) else f"{expression} = {result:,}"
     except Exception as e:
         return f"Could not compute: {expression}. Error: {str(e)}"
@@ -61,13 +114,11 @@ def table_generator_tool(data: List[Dict[str, Any]], title: str = "") -> str:
         return "No data available to create a table."
 
     headers = list(data[0].keys())
+    header_cells = [str(h) for h in headers]
 
-    # Calculate column widths
-    widths = {h: len(str(h)) for h in headers}
-    for row in data:
-        for h in headers:
-            val = str(row.get(h, ""))
-            widths[h] = max(widths[h], len(val))
+    # Stringify every cell once, then derive column widths from the materialized rows
+    str_rows = [[str(row.get(h, "")) for h in headers] for row in data]
+    widths = [max(len(h), *(len(r[i]) for r in str_rows)) for i, h in enumerate(header_cells)]
 
     # Build table
     lines = []
@@ -76,15 +127,11 @@ def table_generator_tool(data: List[Dict[str, Any]], title: str = "") -> str:
         lines.append("")
 
     # Header
-    header_line = "| " + " | ".join(str(h).ljust(widths[h]) for h in headers) + " |"
-    sep_line = "| " + " | ".join("-" * widths[h] for h in headers) + " |"
-    lines.append(header_line)
-    lines.append(sep_line)
+    lines.append("| " + " | ".join(h.ljust(w) for h, w in zip(header_cells, widths)) + " |")
+    lines.append("| " + " | ".join("-" * w for w in widths) + " |")
 
     # Rows
-    for row in data:
-        row_line = "| " + " | ".join(str(row.get(h, "")).ljust(widths[h]) for h in headers) + " |"
-        lines.append(row_line)
+    lines.extend("| " + " | ".join(v.ljust(w) for v, w in zip(r, widths)) + " |" for r in str_rows)
 
     return "\n".join(lines)
 
@@ -127,13 +174,31 @@ def csv_export_tool(data: List[Dict[str, Any]]) -> str:
     if not data:
         return ""
 
+    fieldnames = list(data[0].keys())
+    # Fast path: emit rows with plain joins. Fall back to DictWriter for the cases it
+    # special-cases (single column, non-dict rows, keys outside the header).
+    if len(fieldnames) > 1:
+        field_set = set(fieldnames)
+        if all(isinstance(row, dict) and row.keys() <= field_set for row in data):
+            lines = [",".join(_csv_field(f) for f in fieldnames)]
+            lines.extend(",".join(_csv_field(row.get(f, "")) for f in fieldnames) for row in data)
+            return "\r\n".join(lines) + "\r\n"
+
     output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=data[0].keys())
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
     writer.writeheader()
     writer.writerows(data)
     return output.getvalue()
 
 
+def _csv_field(value: Any) -> str:
+    """Format one cell the way csv's QUOTE_MINIMAL dialect does."""
+    text = "" if value is None else str(value)
+    if _CSV_QUOTE_RE.search(text):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
 # ═══════════════════════════════════════════════════════════════════════
 #  ENTITY EXTRACTOR (helper for summaries)
 # ═══════════════════════════════════════════════════════════════════════
@@ -3,11 +3,18 @@ Lexi-Sense Text Chunker
 Splits documents into overlapping chunks while preserving semantic boundaries.
 Each chunk carries metadata for source tracking.
 """
-from typing import List
+from typing import List, Tuple
 from dataclasses import dataclass, field
 import re
 from backend.config import CHUNK_SIZE, CHUNK_OVERLAP
 
+_SENT_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z])')
+_PAGE_RE = re.compile(r'\[Page (\d+)\]')
+_PARA_RE = re.compile(r'\n\s*\n')
+
+# Buffered chunk fragment: (text, word_count, page_info)
+_Part = Tuple[str, int, str]
+
 
 @dataclass
 class DocumentChunk:
@@ -27,13 +34,13 @@ class DocumentChunk:
 def _split_into_sentences(text: str) -> List[str]:
     """Split text into sentences, preserving structure."""
     # Split on sentence boundaries but keep some structure
-    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', text)
+    sentences = _SENT_RE.split(text)
     return [s.strip() for s in sentences if s.strip()]
 
 
 def _detect_page(text: str) -> str:
     """Try to detect page info from text markers like [Page N]."""
-    match = re.search(r'\[Page (\d+)\]', text)
+    match = _PAGE_RE.search(text)
     return f"Page {match.group(1)}" if match else ""
 
 
@@ -53,91 +60,66 @@ def chunk_text(
 
     chunks: List[DocumentChunk] = []
 
-    # First split by paragraphs (double newline)
-    paragraphs = re.split(r'\n\s*\n', text)
-    paragraphs = [p.strip() for p in paragraphs if p.strip()]
+    # First split by paragraphs (double newline). Each fragment carries its word count and
+    # page marker, computed once, so flushes never re-scan the joined chunk text.
+    paragraphs = [(p, len(p.split()), _detect_page(p)) for p in (p.strip() for p in _PARA_RE.split(text)) if p]
 
-    current_chunk_parts = []
+    current_chunk_parts: List[_Part] = []
     current_word_count = 0
 
-    for para in paragraphs:
-        para_word_count = len(para.split())
-
+    for para, para_word_count, para_page in paragraphs:
         # If a single paragraph exceeds chunk_size, split it further
         if para_word_count > chunk_size:
             # Flush current buffer first
             if current_chunk_parts:
-                chunk_text_content = "\n\n".join(current_chunk_parts)
-                chunks.append(DocumentChunk(
-                    content=chunk_text_content,
-                    chunk_index=len(chunks),
-                    filename=filename,
-                    file_type=file_type,
-                    page_info=_detect_page(chunk_text_content),
-                ))
+                chunks.append(_build_chunk(current_chunk_parts, len(chunks), filename, file_type))
                 # Keep overlap
-                overlap_parts = _get_overlap_parts(current_chunk_parts, chunk_overlap)
-                current_chunk_parts = overlap_parts
-                current_word_count = sum(len(p.split()) for p in current_chunk_parts)
+                current_chunk_parts, current_word_count = _get_overlap_parts(current_chunk_parts, chunk_overlap)
 
             # Split long paragraph by sentences
-            sentences = _split_into_sentences(para)
-            for sentence in sentences:
+            for sentence in _split_into_sentences(para):
                 s_words = len(sentence.split())
                 if current_word_count + s_words > chunk_size and current_chunk_parts:
-                    chunk_text_content = "\n\n".join(current_chunk_parts)
-                    chunks.append(DocumentChunk(
-                        content=chunk_text_content,
-                        chunk_index=len(chunks),
-                        filename=filename,
-                        file_type=file_type,
-                        page_info=_detect_page(chunk_text_content),
-                    ))
-                    overlap_parts = _get_overlap_parts(current_chunk_parts, chunk_overlap)
-                    current_chunk_parts = overlap_parts
-                    current_word_count = sum(len(p.split()) for p in current_chunk_parts)
-
-                current_chunk_parts.append(sentence)
+                    chunks.append(_build_chunk(current_chunk_parts, len(chunks), filename, file_type))
+                    current_chunk_parts, current_word_count = _get_overlap_parts(current_chunk_parts, chunk_overlap)
+
+                current_chunk_parts.append((sentence, s_words, _detect_page(sentence) if para_page else ""))
                 current_word_count += s_words
         else:
             if current_word_count + para_word_count > chunk_size and current_chunk_parts:
-                chunk_text_content = "\n\n".join(current_chunk_parts)
-                chunks.append(DocumentChunk(
-                    content=chunk_text_content,
-                    chunk_index=len(chunks),
-                    filename=filename,
-                    file_type=file_type,
-                    page_info=_detect_page(chunk_text_content),
-                ))
-                overlap_parts = _get_overlap_parts(current_chunk_parts, chunk_overlap)
-                current_chunk_parts = overlap_parts
-                current_word_count = sum(len(p.split()) for p in current_chunk_parts)
-
-            current_chunk_parts.append(para)
+                chunks.append(_build_chunk(current_chunk_parts, len(chunks), filename, file_type))
+                current_chunk_parts, current_word_count = _get_overlap_parts(current_chunk_parts, chunk_overlap)
+
+            current_chunk_parts.append((para, para_word_count, para_page))
             current_word_count += para_word_count
 
     # Flush remaining
     if current_chunk_parts:
-        chunk_text_content = "\n\n".join(current_chunk_parts)
-        chunks.append(DocumentChunk(
-            content=chunk_text_content,
-            chunk_index=len(chunks),
-            filename=filename,
-            file_type=file_type,
-            page_info=_detect_page(chunk_text_content),
-        ))
+        chunks.append(_build_chunk(current_chunk_parts, len(chunks), filename, file_type))
 
     return chunks
 
 
-def _get_overlap_parts(parts: List[str], overlap_words: int) -> List[str]:
-    """Get the tail parts that contain roughly overlap_words words."""
+def _build_chunk(parts: List[_Part], chunk_index: int, filename: str, file_type: str) -> DocumentChunk:
+    """Join buffered parts into a chunk; page info comes from the first part with a marker."""
+    return DocumentChunk(
+        content="\n\n".join(p[0] for p in parts),
+        chunk_index=chunk_index,
+        filename=filename,
+        file_type=file_type,
+        page_info=next((p[2] for p in parts if p[2]), ""),
+    )
+
+
+def _get_overlap_parts(parts: List[_Part], overlap_words: int) -> Tuple[List[_Part], int]:
+    """Get the tail parts that contain roughly overlap_words words, and their total word count."""
     result = []
     word_count = 0
     for part in reversed(parts):
-        pw = len(part.split())
+        pw = part[1]
         if word_count + pw > overlap_words and result:
             break
-        result.insert(0, part)
+        result.append(part)
         word_count += pw
-    return result
+    result.reverse()
+    return result, word_count
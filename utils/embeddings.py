@@ -5,103 +5,237 @@ Removes dependency on Torch/Sentence-Transformers to fit Lambda limits.
 Created by Geo Cherian Mathew.
 """
 import numpy as np
+import copy
 import os
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, field
 import math
 import re
+import logging
+from collections import Counter, OrderedDict
 
-from backend.config import EMBEDDING_MODEL, TOP_K_RESULTS, SEMANTIC_WEIGHT, KEYWORD_WEIGHT, GROQ_API_KEY
+from backend.config import EMBEDDING_MODEL, EMBEDDING_DIMENSION, EMBEDDING_DTYPE, BM25_BACKEND, ANN_BACKEND, ANN_MIN_CHUNKS, ANN_CANDIDATES, HNSW_M, HNSW_EF_SEARCH, TOP_K_RESULTS, SEMANTIC_WEIGHT, KEYWORD_WEIGHT, GROQ_API_KEY
 from utils.chunker import DocumentChunk
 
+try:
+    # Embedding responses are large float arrays; orjson parses them far faster than stdlib json
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+logger = logging.getLogger("cortex-ai")
+
 # Constants
 # Use the full model path for HuggingFace
 HF_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
 HF_API_URL = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{HF_MODEL_ID}"
+HF_BATCH_SIZE = 64
+HF_MAX_PARALLEL = 4
+HF_RETRY_DELAYS = (0.5, 1.0, 2.0)
+QUERY_CACHE_SIZE = 128
+_WS_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\w+')
+
+# One pooled HTTP session for every store, so TCP/TLS connections to HF are reused
+_http_session = requests.Session()
+_http_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=HF_MAX_PARALLEL))
 
 class BM25:
-    """Simple BM25 implementation for keyword search."""
+    """
+    BM25 keyword search over a NumPy inverted index.
+    Each term maps to (doc_ids, term_freqs) arrays, so scoring a query token is a
+    vectorized gather over its postings instead of a Python loop over every document.
+    """
     def __init__(self, k1: float = 1.5, b: float = 0.75):
         self.k1 = k1
         self.b = b
         self.corpus_size = 0
         self.avg_dl = 0
-        self.doc_freqs: Dict[str, int] = {}
-        self.doc_lens: List[int] = []
-        self.tokenized_corpus: List[List[str]] = []
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.doc_lens: np.ndarray = np.zeros(0, dtype=np.float32)
+        # Per-document length normalization: k1 * (1 - b + b * dl / avg_dl)
+        self._len_norm: np.ndarray = np.zeros(0, dtype=np.float32)
 
     def _tokenize(self, text: str) -> List[str]:
         # Handle empty/none
         if not text: return []
-        return re.findall(r'\w+', text.lower())
+        return _WORD_RE.findall(text.lower())
+
+    def clone(self) -> "BM25":
+        """Independent copy to index into off to the side; add() never mutates arrays in place."""
+        other = copy.copy(self)
+        other.postings = dict(self.postings)
+        return other
 
     def fit(self, corpus: List[str]):
-        self.tokenized_corpus = [self._tokenize(doc) for doc in corpus]
-        self.corpus_size = len(corpus)
-        self.doc_lens = [len(doc) for doc in self.tokenized_corpus]
-        self.avg_dl = sum(self.doc_lens) / max(self.corpus_size, 1)
-        self.doc_freqs = {}
-        for doc in self.tokenized_corpus:
-            unique_terms = set(doc)
-            for term in unique_terms:
-                self.doc_freqs[term] = self.doc_freqs.get(term, 0) + 1
-
-    def score(self, query: str) -> List[float]:
+        self.postings = {}
+        self.corpus_size = 0
+        self.doc_lens = np.zeros(0, dtype=np.float32)
+        self.add(corpus)
+
+    def add(self, docs: List[str]):
+        """Index new documents in O(new tokens); ids continue from the current corpus size."""
+        if not docs: return
+        doc_ids: Dict[str, List[int]] = {}
+        tfs: Dict[str, List[int]] = {}
+        doc_lens = []
+        for i, doc in enumerate(docs, start=self.corpus_size):
+            tokens = self._tokenize(doc)
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                doc_ids.setdefault(term, []).append(i)
+                tfs.setdefault(term, []).append(tf)
+        for term, ids in doc_ids.items():
+            new_ids = np.array(ids, dtype=np.int32)
+            new_tfs = np.array(tfs[term], dtype=np.float32)
+            if term in self.postings:
+                old_ids, old_tfs = self.postings[term]
+                new_ids = np.concatenate([old_ids, new_ids])
+                new_tfs = np.concatenate([old_tfs, new_tfs])
+            self.postings[term] = (new_ids, new_tfs)
+        self.corpus_size += len(docs)
+        self.doc_lens = np.concatenate([self.doc_lens, np.array(doc_lens, dtype=np.float32)])
+        self.avg_dl = float(self.doc_lens.sum()) / max(self.corpus_size, 1)
+        # avg_dl moved, so the length normalization is refreshed for every document (one vector op)
+        self._len_norm = self.k1 * (1 - self.b + self.b * self.doc_lens / (self.avg_dl or 1))
+
+    def score(self, query: str) -> np.ndarray:
         query_tokens = self._tokenize(query)
-        scores = [0.0] * self.corpus_size
+        scores = np.zeros(self.corpus_size, dtype=np.float32)
         if self.corpus_size == 0 or not query_tokens: return scores
-        for token in query_tokens:
-            if token not in self.doc_freqs: continue
-            df = self.doc_freqs[token]
+        # Repeated query terms are scored once and weighted by their count
+        for token, qtf in Counter(query_tokens).items():
+            postings = self.postings.get(token)
+            if postings is None: continue
+            ids, tf = postings
+            df = len(ids)
             idf = math.log((self.corpus_size - df + 0.5) / (df + 0.5) + 1)
-            for i, doc in enumerate(self.tokenized_corpus):
-                tf = doc.count(token)
-                dl = self.doc_lens[i]
-                numerator = tf * (self.k1 + 1)
-                denominator = tf + self.k1 * (1 - self.b + self.b * dl / self.avg_dl)
-                scores[i] += idf * (numerator / denominator)
+            scores[ids] += (qtf * idf) * (tf * (self.k1 + 1)) / (tf + self._len_norm[ids])
         return scores
 
+class Bm25sIndex(BM25):
+    """
+    BM25 backed by the `bm25s` package (sparse SciPy index) for large corpora.
+    Shares the built-in tokenizer so both backends rank the same tokens.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        super().__init__(k1, b)
+        self.retriever = None
+        # The corpus is kept for re-indexing as per-document token-id lists (the form bm25s
+        # indexes directly), not as lists of token strings
+        self._vocab: Dict[str, int] = {}
+        self._doc_ids: List[List[int]] = []
+
+    def clone(self) -> "Bm25sIndex":
+        other = copy.copy(self)
+        other._vocab = dict(self._vocab)
+        other._doc_ids = list(self._doc_ids)
+        return other
+
+    def fit(self, corpus: List[str]):
+        self._vocab = {}
+        self._doc_ids = []
+        self.add(corpus)
+
+    def add(self, docs: List[str]):
+        # bm25s has no incremental API, so only tokenization is incremental here
+        import bm25s
+        from bm25s.tokenization import Tokenized
+        vocab = self._vocab
+        for doc in docs:
+            self._doc_ids.append([vocab.setdefault(t, len(vocab)) for t in self._tokenize(doc)])
+        self.corpus_size = len(self._doc_ids)
+
+        self.retriever = bm25s.BM25(k1=self.k1, b=self.b)
+        # bm25s may extend the vocab it is given, so hand it a copy
+        self.retriever.index(Tokenized(ids=self._doc_ids, vocab=dict(vocab)), show_progress=False)
+
+    def score(self, query: str) -> np.ndarray:
+        if self.retriever is None or self.corpus_size == 0:
+            return np.zeros(self.corpus_size, dtype=np.float32)
+        vocab = self.retriever.vocab_dict
+        query_tokens = [t for t in self._tokenize(query) if t in vocab]
+        if not query_tokens:
+            return np.zeros(self.corpus_size, dtype=np.float32)
+        return np.asarray(self.retriever.get_scores(query_tokens), dtype=np.float32)
+
+def make_bm25() -> BM25:
+    """Build the keyword index selected by BM25_BACKEND."""
+    if BM25_BACKEND == "bm25s":
+        try:
+            import bm25s  # noqa: F401
+            return Bm25sIndex()
+        except ImportError:
+            logger.warning("BM25_BACKEND=bm25s but bm25s is not installed; using built-in BM25")
+    return BM25()
+
+def build_hnsw_index(embeddings: np.ndarray):
+    """Build a FAISS HNSW inner-product index over unit-norm float32 rows, or None if FAISS is missing."""
+    try:
+        import faiss
+    except ImportError:
+        logger.warning("ANN_BACKEND=faiss but faiss is not installed; using exact search")
+        return None
+    index = faiss.IndexHNSWFlat(embeddings.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efSearch = max(HNSW_EF_SEARCH, ANN_CANDIDATES)
+    index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    return index
+
 class VectorStore:
     """Session-based vector storage using Numpy for similarity."""
     def __init__(self):
         self.embeddings: Optional[np.ndarray] = None
+        # Per-row dequantization scales when EMBEDDING_DTYPE is "int8"
+        self._emb_scales: Optional[np.ndarray] = None
         self.chunks: List[DocumentChunk] = []
-        self.bm25 = BM25()
+        # Optional HNSW index over all rows (see ANN_BACKEND); built once the store is large
+        self._ann = None
+        self._ann_disabled = False
+        # filename -> row indices of its chunks, in upload order
+        self.file_index: Dict[str, np.ndarray] = {}
+        self.bm25 = make_bm25()
         self._initialized = False
+        # Bumped on every mutation so callers can invalidate derived caches
+        self.version = 0
+        # LRU of normalized query text -> unit-norm query embedding
+        self._qcache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Uploads and searches run on worker threads. _write_lock serializes mutations end to
+        # end; _lock guards the published state (rows, chunks, indexes) that searches read.
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
         # Get token from environment
         self.hf_token = os.getenv("HUGGINGFACE_TOKEN", "")
 
-    def embed(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings via HuggingFace Inference API or fallback."""
-        # Standard model dimension for all-MiniLM-L6-v2 is 384
-        dim = 384
-        
-        if not self.hf_token or not texts:
-            return np.zeros((len(texts), dim), dtype="float32")
-
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one sub-batch, retrying while the HF model is loading."""
+        dim = EMBEDDING_DIMENSION
         headers = {"Authorization": f"Bearer {self.hf_token}"}
-        
-        for _ in range(3):
+
+        for delay in HF_RETRY_DELAYS:
             try:
-                response = requests.post(
+                response = _http_session.post(
                     HF_API_URL, 
                     headers=headers, 
                     json={"inputs": texts, "options": {"wait_for_model": True}},
                     timeout=8.0  # Keep it under Vercel's limit
                 )
                 if response.status_code == 200:
-                    data = response.json()
+                    data = _json_loads(response.content)
                     # HF API returns a list of floats (for 1 item) or list of lists (for multiple)
                     # We need to ensure we return a 2D array
-                    res = np.array(data, dtype="float32")
+                    res = np.ascontiguousarray(data, dtype=np.float32)
                     if res.ndim == 1:
                         res = res.reshape(1, -1)
+                    # Unit-normalize once here so every consumer can use plain dot products
+                    res /= (np.linalg.norm(res, axis=1, keepdims=True) + 1e-10)
                     return res
                 elif response.status_code == 503: # Model loading
-                    time.sleep(1.5)
+                    time.sleep(delay)
                     continue
                 else:
                     break
@@ -110,48 +244,189 @@ class VectorStore:
                 
         return np.zeros((len(texts), dim), dtype="float32")
 
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Generate L2-normalized float32 embeddings via HuggingFace Inference API or fallback."""
+        if not self.hf_token or not texts:
+            return np.zeros((len(texts), EMBEDDING_DIMENSION), dtype="float32")
+
+        # Keep each request small enough to finish inside the serverless timeout,
+        # and send the sub-batches concurrently over the shared connection pool
+        batches = [texts[i:i + HF_BATCH_SIZE] for i in range(0, len(texts), HF_BATCH_SIZE)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        with ThreadPoolExecutor(max_workers=min(HF_MAX_PARALLEL, len(batches))) as ex:
+            return np.vstack(list(ex.map(self._embed_batch, batches)))
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed and L2-normalize a single query.
+        Results are cached by whitespace/case-normalized text, so retrieval and the agent's
+        response cache share one API call and repeat questions skip the round-trip entirely.
+        """
+        key = _WS_RE.sub(" ", query.strip().lower())
+        cached = self._qcache.get(key)
+        if cached is not None:
+            self._qcache.move_to_end(key)
+            return cached
+
+        vec = self.embed([query])[0]
+        # Don't pin the zero-vector fallback from a failed request
+        if np.any(vec):
+            self._qcache[key] = vec
+            if len(self._qcache) > QUERY_CACHE_SIZE:
+                self._qcache.popitem(last=False)
+        return vec
+
+    @staticmethod
+    def _encode_rows(emb: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Convert unit-norm float32 rows to the configured storage dtype."""
+        if EMBEDDING_DTYPE == "int8":
+            # Symmetric per-row quantization: row ~= q_row * scale
+            scales = (np.abs(emb).max(axis=1) / 127.0 + 1e-10).astype(np.float32)
+            return np.round(emb / scales[:, None]).astype(np.int8), scales
+        if EMBEDDING_DTYPE == "float16":
+            return emb.astype(np.float16), None
+        return emb, None
+
+    def _semantic_scores(self, norm_query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of the query against every stored row, or only `rows` when given."""
+        emb = self.embeddings if rows is None else self.embeddings[rows]
+        if emb.dtype == np.float32:
+            scores = emb @ norm_query
+        else:
+            # Reduced-precision rows: einsum upcasts in buffered blocks and accumulates in
+            # float32, rather than materializing a float32 copy of the whole matrix per query
+            scores = np.einsum("ij,j->i", emb, norm_query, dtype=np.float32)
+        if self._emb_scales is not None:
+            scores *= self._emb_scales if rows is None else self._emb_scales[rows]
+        return scores.astype(np.float32, copy=False)
+
+    def _dequantized(self) -> np.ndarray:
+        """All stored rows as float32."""
+        emb = self.embeddings.astype(np.float32)
+        if self._emb_scales is not None:
+            emb *= self._emb_scales[:, None]
+        return emb
+
+    def _update_ann(self, new_f32: np.ndarray):
+        if self._ann is not None:
+            self._ann.add(np.ascontiguousarray(new_f32, dtype=np.float32))
+        elif ANN_BACKEND == "faiss" and not self._ann_disabled and len(self.chunks) >= ANN_MIN_CHUNKS:
+            self._ann = build_hnsw_index(self._dequantized())
+            self._ann_disabled = self._ann is None
+
+    def _ann_semantic_scores(self, norm_query: np.ndarray) -> np.ndarray:
+        """Semantic scores for the ANN candidates; every other row scores 0."""
+        n = len(self.chunks)
+        sims, ids = self._ann.search(norm_query.reshape(1, -1).astype(np.float32, copy=False), min(ANN_CANDIDATES, n))
+        scores = np.zeros(n, dtype=np.float32)
+        found = ids[0] >= 0
+        scores[ids[0][found]] = sims[0][found]
+        return scores
+
     def add_chunks(self, chunks: List[DocumentChunk]):
         if not chunks: return
         texts = [c.content for c in chunks]
-        new_embeddings = self.embed(texts)
-        if self.embeddings is None:
-            self.embeddings = new_embeddings
-        else:
-            self.embeddings = np.vstack([self.embeddings, new_embeddings])
-        self.chunks.extend(chunks)
-        all_texts = [c.content for c in self.chunks]
-        self.bm25.fit(all_texts)
-        self._initialized = True
+        with self._write_lock:
+            # Index keywords into a copy on a worker thread while the embedding request is in
+            # flight; searches keep using the published index until everything is swapped in.
+            # Rows come back unit-norm from embed(), so searches reduce to a plain dot product
+            staged_bm25 = self.bm25.clone()
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                bm25_done = ex.submit(staged_bm25.add, texts)
+                new_f32 = self.embed(texts)
+                bm25_done.result()
+            new_embeddings, new_scales = self._encode_rows(new_f32)
+            if self.embeddings is None:
+                embeddings, emb_scales = new_embeddings, new_scales
+            else:
+                embeddings = np.vstack([self.embeddings, new_embeddings])
+                emb_scales = None if new_scales is None else np.concatenate([self._emb_scales, new_scales])
+            start = len(self.chunks)
+            new_rows: Dict[str, List[int]] = {}
+            for i, c in enumerate(chunks, start=start):
+                new_rows.setdefault(c.filename, []).append(i)
+            file_index = dict(self.file_index)
+            for filename, rows in new_rows.items():
+                rows = np.array(rows, dtype=np.intp)
+                old = file_index.get(filename)
+                file_index[filename] = rows if old is None else np.concatenate([old, rows])
+
+            with self._lock:
+                self.bm25 = staged_bm25
+                self.embeddings, self._emb_scales = embeddings, emb_scales
+                self.chunks = self.chunks + chunks
+                self.file_index = file_index
+                self._update_ann(new_f32)
+                self._initialized = True
+                self.version += 1
 
-    def hybrid_search(self, query: str, top_k: int = TOP_K_RESULTS) -> List[Tuple[DocumentChunk, float]]:
+    def hybrid_search(self, query: str, top_k: int = TOP_K_RESULTS,
+                      file_filter: Optional[str] = None) -> List[Tuple[DocumentChunk, float]]:
         if not self._initialized or not self.chunks: return []
-        n = len(self.chunks)
-        
+        if file_filter and file_filter not in self.file_index: return []
+
+        # Embed before taking the lock: the HF round-trip must not block uploads or other searches
+        norm_query = self.embed_query(query)
+        with self._lock:
+            return self._search(query, norm_query, top_k, file_filter)
+
+    def _search(self, query: str, norm_query: np.ndarray, top_k: int,
+                file_filter: Optional[str]) -> List[Tuple[DocumentChunk, float]]:
+        """Score and rank against the published state; caller holds self._lock."""
         # ── Semantic Scores (Cosine Similarity via Numpy) ────────────────
-        query_emb = self.embed([query])[0]
-        # Dot product of normalized vectors
-        norm_query = query_emb / (np.linalg.norm(query_emb) + 1e-10)
-        norm_embeddings = self.embeddings / (np.linalg.norm(self.embeddings, axis=1, keepdims=True) + 1e-10)
-        semantic_scores = np.dot(norm_embeddings, norm_query)
-        
-        s_max = semantic_scores.max()
-        if s_max > 0: semantic_scores /= s_max
+        # Stored rows and the query are unit-norm float32 from embed(), so cosine is one BLAS GEMV
+        # A file filter is pushed down: only that file's rows are scored and normalized
+        rows = None
+        if file_filter:
+            rows = self.file_index.get(file_filter)
+            if rows is None: return []
+
+        if rows is None and self._ann is not None:
+            semantic_scores = self._ann_semantic_scores(norm_query)
+        else:
+            semantic_scores = self._semantic_scores(norm_query, rows)
 
         # ── Keyword Scores ─────────────────────────────────────────────
-        keyword_scores = np.array(self.bm25.score(query))
-        k_max = keyword_scores.max()
-        if k_max > 0: keyword_scores /= k_max
+        keyword_scores = self.bm25.score(query)
+        if rows is not None:
+            keyword_scores = keyword_scores[rows]
 
         # ── Combined ───────────────────────────────────────────────────
-        combined = SEMANTIC_WEIGHT * semantic_scores + KEYWORD_WEIGHT * keyword_scores
-        top_indices = np.argsort(combined)[::-1][:top_k]
-        return [(self.chunks[i], float(combined[i])) for i in top_indices if combined[i] > 0]
+        # Max-normalization is folded into the weights so the blend is a single pass per array
+        s_max = semantic_scores.max()
+        k_max = keyword_scores.max()
+        s_weight = SEMANTIC_WEIGHT / s_max if s_max > 0 else SEMANTIC_WEIGHT
+        k_weight = KEYWORD_WEIGHT / k_max if k_max > 0 else KEYWORD_WEIGHT
+        combined = s_weight * semantic_scores + k_weight * keyword_scores
+
+        # Partial selection is O(N); only the top_k survivors get sorted
+        k = min(top_k, combined.size)
+        if k <= 0: return []
+        idx = np.argpartition(-combined, k - 1)[:k]
+        top_indices = idx[np.argsort(-combined[idx], kind="stable")]
+        chunk_rows = top_indices if rows is None else rows[top_indices]
+        return [(self.chunks[r], float(combined[i])) for i, r in zip(top_indices, chunk_rows) if combined[i] > 0]
+
+    def get_files(self) -> List[str]:
+        """Unique filenames in the store, in upload order."""
+        return list(self.file_index)
+
+    def get_file_chunks(self, filename: str) -> List[DocumentChunk]:
+        with self._lock:
+            return [self.chunks[i] for i in self.file_index.get(filename, ())]
 
     def clear(self):
-        self.embeddings = None
-        self.chunks = []
-        self.bm25 = BM25()
-        self._initialized = False
+        with self._write_lock, self._lock:
+            self.embeddings = None
+            self._emb_scales = None
+            self.chunks = []
+            self.file_index = {}
+            self._ann = None
+            self._ann_disabled = False
+            self.bm25 = make_bm25()
+            self._initialized = False
+            self.version += 1
 
     @property
     def total_chunks(self) -> int:
@@ -15,21 +15,54 @@ import csv
 import io
 import json
 import re
+import html
 import base64
+import hashlib
+import tempfile
+import functools
+import itertools
+import shutil
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Tuple
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
 
 import pypdf
 # Lazy import for large/native libs below in functions
+# import pymupdf (optional, faster PDF text extraction)
 # import docx
 # import pandas as pd
 # from PIL import Image
-from groq import Groq
+from groq import Groq, BadRequestError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import configuration
-from backend.config import GROQ_API_KEY, VISION_MODEL, TRANSCRIPTION_MODEL
+from backend.config import (
+    GROQ_API_KEY, VISION_MODEL, TRANSCRIPTION_MODEL, PARSE_CACHE_MAX_ENTRIES, PARSE_CACHE_MAX_CHARS,
+    PARSE_CACHE_DIR, PARSE_CACHE_DISABLED, PARSE_CACHE_DIR_MAX_ENTRIES, PARSE_CACHE_DIR_MAX_MB,
+)
+from backend.rate_limit import groq_call
+
+
+# Same tokens as str.split(): runs of non-whitespace
+_WORD_RE = re.compile(r'\S+')
+
+
+def _count_words(text: str) -> int:
+    """Count whitespace-separated words without materializing the token list."""
+    count = 0
+    for _ in _WORD_RE.finditer(text):
+        count += 1
+    return count
 
 
 @dataclass
@@ -39,14 +72,46 @@ class ParsedDocument:
     file_type: str
     content: str
     page_count: int = 1
-    word_count: int = 0
-    char_count: int = 0
     metadata: dict = field(default_factory=dict)
     parsed_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
 
-    def __post_init__(self):
-        self.word_count = len(self.content.split())
-        self.char_count = len(self.content)
+    # Derived lazily: callers that only feed .content onward never pay for the scan
+    @functools.cached_property
+    def word_count(self) -> int:
+        return _count_words(self.content)
+
+    @functools.cached_property
+    def char_count(self) -> int:
+        return len(self.content)
+
+
+# Rows of a CSV sent for analysis (limit for cloud analysis)
+CSV_MAX_ROWS = 150
+# Most images the Vision API accepts in one request; longer frame lists are described one by one
+VIDEO_FRAMES_PER_REQUEST = 5
+
+# Binary sniffing: share of ASCII control bytes (other than tab/newline/CR) in the file head
+BINARY_SNIFF_BYTES = 2048
+_CONTROL_BYTES = bytes(i for i in range(32) if i not in (9, 10, 13)) + b"\x7f"
+
+# Fields of ffmpeg's input banner used to probe videos without ffprobe
+_FF_DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+_FF_SIZE_RE = re.compile(r'Stream #.*?Video: .*?, (\d{2,5})x(\d{2,5})[ ,]')
+_FF_FPS_RE = re.compile(r'Stream #.*?Video: .*?, ([\d.]+) fps')
+_FF_AUDIO_RE = re.compile(r'Stream #.*?Audio: ')
+
+# Numbers orjson would print differently from json.dumps: 16+ digit runs (integers past i64/u64
+# are read as floats, and floats >= 1e16 switch to exponent form) and floats written with an
+# exponent or below 1e-4, whose exponent spelling / fixed-vs-exponent choice differs
+_JSON_NUMBER_GUARD_RE = re.compile(rb'(?:^|[:\[,])\s*-?(?:\d{16,}|\d+(?:\.\d*)?[eE]|0\.0000)')
+
+# HTML stripping patterns, compiled once
+_RE_SCRIPT = re.compile(r'<(script|style|noscript)\b[^>]*>.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+_RE_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_RE_BLOCK = re.compile(r'<(?:br|hr|/?(?:p|div|li|tr|h[1-6]|table|ul|ol|section|article|header|footer|blockquote|pre))\b[^>]*>', re.IGNORECASE)
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_WS = re.compile(r'[^\S\n]+')
+_RE_BLANK_LINES = re.compile(r'\n{3,}')
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -62,14 +127,206 @@ def get_groq_client():
 def encode_image(image_path: str):
     """Encode an image to base64 for vision processing."""
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+        return base64.b64encode(image_file.read()).decode('ascii')
+
+
+def _source(file_path: str, data: Optional[bytes]):
+    """In-memory buffer when the upload bytes are given, else the path itself."""
+    return io.BytesIO(data) if data is not None else file_path
+
+
+def _read_bytes(file_path: str, data: Optional[bytes]) -> bytes:
+    if data is not None:
+        return data
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def _read_text(file_path: str, data: Optional[bytes]) -> str:
+    if data is not None:
+        return data.decode("utf-8", errors="replace")
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _open_text(file_path: str, data: Optional[bytes]) -> io.TextIOBase:
+    """Lazily decoding text stream over the upload bytes or the file (newline="" as csv expects)."""
+    if data is not None:
+        return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors="replace", newline="")
+    return open(file_path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _content_hash(file_path: str, data: Optional[bytes]) -> str:
+    """sha256 of the file content, streamed in blocks when reading from disk."""
+    if data is not None:
+        return hashlib.sha256(data).hexdigest()
+    with open(file_path, "rb") as f:
+        h = hashlib.sha256()
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+        return h.hexdigest()
+
+
+def _prune_disk_cache():
+    """Delete the least recently used cache entries (by mtime, refreshed on hits) beyond the size bounds."""
+    entries = []
+    with os.scandir(PARSE_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".json"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    limit = PARSE_CACHE_DIR_MAX_MB * 1024 * 1024
+    if len(entries) <= PARSE_CACHE_DIR_MAX_ENTRIES and total <= limit:
+        return
+    entries.sort()
+    count = len(entries)
+    for _, size, path in entries:
+        if count <= PARSE_CACHE_DIR_MAX_ENTRIES and total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        count -= 1
+        total -= size
+
+
+def _disk_cached(parser):
+    """
+    Persist a media parser's result on disk keyed by content hash, so re-uploading
+    identical media skips the paid Vision/Whisper calls. Failed or partial parses
+    (any "error" in metadata) are not cached.
+    """
+    @functools.wraps(parser)
+    def wrapper(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
+        if PARSE_CACHE_DISABLED or not GROQ_API_KEY:
+            return parser(file_path, data)
+        try:
+            cache_path = PARSE_CACHE_DIR / f"{parser.__name__}-{_content_hash(file_path, data)}.json"
+        except OSError:
+            return parser(file_path, data)
+
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            cached["filename"] = Path(file_path).name
+            # Entries written before the counts became derived properties still carry them
+            cached.pop("word_count", None)
+            cached.pop("char_count", None)
+            result = ParsedDocument(**cached)
+            try:
+                os.utime(cache_path)  # mark as recently used for pruning
+            except OSError:
+                pass
+            return result
+        except (OSError, ValueError, TypeError):
+            pass
+
+        result = parser(file_path, data)
+        if "error" not in result.metadata:
+            try:
+                PARSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                # Write to a temp file and rename so readers never see a partial entry
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=PARSE_CACHE_DIR,
+                                                 suffix=".tmp", delete=False) as tmp:
+                    json.dump(asdict(result), tmp, ensure_ascii=False)
+                os.replace(tmp.name, cache_path)
+                _prune_disk_cache()
+            except (OSError, TypeError, ValueError):
+                pass
+        return result
+    return wrapper
 
 
 # ═══════════════════════════════════════════════════════════════════════
 #  IMAGE PARSER (VISION)
 # ═══════════════════════════════════════════════════════════════════════
 
-def parse_image(file_path: str) -> ParsedDocument:
+_PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# Start-of-frame markers carry the dimensions (C4/C8/CC are DHT/JPG/DAC, not frames)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png_info(raw: bytes) -> Optional[Tuple[int, int, str, str]]:
+    if raw[12:16] != b"IHDR":
+        return None
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", raw[16:26])
+    mode = _PNG_MODES.get(color_type) if bit_depth == 8 else None
+    return (width, height, "PNG", mode) if mode else None
+
+
+def _jpeg_info(raw: bytes) -> Optional[Tuple[int, int, str, str]]:
+    i = 2
+    while i + 9 < len(raw):
+        if raw[i] != 0xFF:
+            return None
+        marker = raw[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF:
+            height, width, components = struct.unpack(">HHB", raw[i + 5:i + 10])
+            mode = _JPEG_MODES.get(components)
+            return (width, height, "JPEG", mode) if mode else None
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # standalone markers have no length
+            i += 2
+            continue
+        i += 2 + struct.unpack(">H", raw[i + 2:i + 4])[0]
+    return None
+
+
+def _webp_info(raw: bytes) -> Optional[Tuple[int, int, str, str]]:
+    chunk = raw[12:16]
+    if chunk == b"VP8X":
+        has_alpha = raw[20] & 0x10
+        width = int.from_bytes(raw[24:27], "little") + 1
+        height = int.from_bytes(raw[27:30], "little") + 1
+    elif chunk == b"VP8 ":
+        if raw[23:26] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack("<HH", raw[26:30])
+        width, height, has_alpha = width & 0x3FFF, height & 0x3FFF, False
+    elif chunk == b"VP8L":
+        if raw[20] != 0x2F:
+            return None
+        bits = int.from_bytes(raw[21:25], "little")
+        width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        has_alpha = (bits >> 28) & 1
+    else:
+        return None
+    return (width, height, "WEBP", "RGBA" if has_alpha else "RGB")
+
+
+def _image_info(raw: bytes) -> Tuple[int, int, Optional[str], str]:
+    """
+    (width, height, format, mode) read from the header bytes for PNG/JPEG/WebP,
+    falling back to Pillow for other formats or anything unusual.
+    """
+    info = None
+    try:
+        if raw[:8] == b"\x89PNG\r\n\x1a\n":
+            info = _png_info(raw)
+        elif raw[:3] == b"\xff\xd8\xff":
+            info = _jpeg_info(raw)
+        elif raw[:4] == b"RIFF" and raw[8:12] == b"WEBP":
+            info = _webp_info(raw)
+    except (struct.error, IndexError):
+        info = None
+    if info is not None:
+        return info
+
+    from PIL import Image
+    img = Image.open(io.BytesIO(raw))
+    return img.size[0], img.size[1], img.format, img.mode
+
+
+@_disk_cached
+def parse_image(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     """Analyze image using Groq Vision model."""
     client = get_groq_client()
     if not client:
@@ -80,13 +337,13 @@ def parse_image(file_path: str) -> ParsedDocument:
         )
 
     try:
-        from PIL import Image
-        base64_image = encode_image(file_path)
-        img = Image.open(file_path)
-        width, height = img.size
+        raw = _read_bytes(file_path, data)
+        base64_image = base64.b64encode(raw).decode('ascii')
+        width, height, img_format, img_mode = _image_info(raw)
 
         # Use Llama Vision to describe and extract OCR
-        response = client.chat.completions.create(
+        response = groq_call(
+            client.chat.completions.create,
             model=VISION_MODEL,
             messages=[{
                 "role": "user",
@@ -100,17 +357,17 @@ def parse_image(file_path: str) -> ParsedDocument:
         )
 
         analysis = response.choices[0].message.content
-        content = f"--- Image Analysis ---\nDimensions: {width}x{height}\nFormat: {img.format}\n\n{analysis}"
+        content = f"--- Image Analysis ---\nDimensions: {width}x{height}\nFormat: {img_format}\n\n{analysis}"
 
         return ParsedDocument(
             filename=Path(file_path).name,
-            file_type=img.format.lower() if img.format else "image",
+            file_type=img_format.lower() if img_format else "image",
             content=content,
             metadata={
                 "width": width,
                 "height": height,
-                "format": img.format,
-                "mode": img.mode
+                "format": img_format,
+                "mode": img_mode
             }
         )
     except Exception as e:
@@ -126,7 +383,8 @@ def parse_image(file_path: str) -> ParsedDocument:
 #  VIDEO & AUDIO PARSER (WHISPER + VISION)
 # ═══════════════════════════════════════════════════════════════════════
 
-def parse_audio(file_path: str) -> ParsedDocument:
+@_disk_cached
+def parse_audio(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     """Transcribe audio using Groq Whisper."""
     client = get_groq_client()
     if not client:
@@ -137,13 +395,20 @@ def parse_audio(file_path: str) -> ParsedDocument:
         )
 
     try:
-        with open(file_path, "rb") as file:
-            transcription = client.audio.transcriptions.create(
-                file=(Path(file_path).name, file.read()),
-                model=TRANSCRIPTION_MODEL,
-                response_format="verbose_json",
-            )
-        
+        # Hand the SDK a file handle so the multipart upload streams from disk instead of
+        # first loading the whole recording into memory
+        with (io.BytesIO(data) if data is not None else open(file_path, "rb")) as audio_file:
+            def transcribe():
+                # Rewind so a rate-limit retry re-uploads the whole recording
+                audio_file.seek(0)
+                return client.audio.transcriptions.create(
+                    file=(Path(file_path).name, audio_file),
+                    model=TRANSCRIPTION_MODEL,
+                    response_format="verbose_json",
+                )
+
+            transcription = groq_call(transcribe)
+
         content = f"--- Audio Transcription ---\n{transcription.text}"
         
         return ParsedDocument(
@@ -164,77 +429,198 @@ def parse_audio(file_path: str) -> ParsedDocument:
         )
 
 
-def parse_video(file_path: str) -> ParsedDocument:
+def _ffmpeg_exe() -> str:
+    """System ffmpeg, else the binary bundled with imageio-ffmpeg."""
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        raise RuntimeError("ffmpeg not found")
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def _probe_video(ffmpeg: str, file_path: str) -> Dict[str, Any]:
+    """Read duration, resolution, fps and audio presence from ffmpeg's input banner."""
+    banner = subprocess.run(
+        [ffmpeg, "-hide_banner", "-i", file_path],
+        capture_output=True, text=True, errors="replace",
+    ).stderr
+    duration = _FF_DURATION_RE.search(banner)
+    if not duration:
+        raise RuntimeError("could not read video stream")
+    hours, minutes, seconds = duration.groups()
+    size = _FF_SIZE_RE.search(banner)
+    fps = _FF_FPS_RE.search(banner)
+    return {
+        "duration": int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        "width": int(size.group(1)) if size else 0,
+        "height": int(size.group(2)) if size else 0,
+        "fps": float(fps.group(1)) if fps else 0.0,
+        "has_audio": _FF_AUDIO_RE.search(banner) is not None,
+    }
+
+
+def _transcribe_video_audio(ffmpeg: str, file_path: str) -> Tuple[str, Optional[str]]:
+    """
+    Pipe the audio track out of ffmpeg as 16 kHz mono MP3 and transcribe it.
+    Returns (content, error), where error is the transcription failure, if any.
+    """
+    proc = subprocess.run(
+        [ffmpeg, "-loglevel", "error", "-i", file_path, "-vn", "-ac", "1", "-ar", "16000", "-f", "mp3", "pipe:1"],
+        capture_output=True,
+    )
+    if proc.returncode != 0 or not proc.stdout:
+        return "No audio track found.", None
+    parsed = parse_audio(f"{Path(file_path).stem}.mp3", data=proc.stdout)
+    return parsed.content, parsed.metadata.get("error")
+
+
+def _extract_frames(ffmpeg: str, file_path: str, times: List[float], out_dir: str) -> List[Tuple[float, str]]:
+    """Grab one JPEG per timestamp in a single ffmpeg run (one fast-seeked input per frame)."""
+    cmd = [ffmpeg, "-loglevel", "error", "-y"]
+    for t in times:
+        cmd += ["-ss", f"{t:.3f}", "-i", file_path]
+    outputs = []
+    for i, t in enumerate(times):
+        frame_path = os.path.join(out_dir, f"frame_{i}.jpg")
+        cmd += ["-map", f"{i}:v:0", "-frames:v", "1", frame_path]
+        outputs.append((t, frame_path))
+    subprocess.run(cmd, capture_output=True)
+    # A seek past the last decodable frame yields no image; skip those
+    return [(t, path) for t, path in outputs if os.path.exists(path)]
+
+
+def _describe_frame(client, t: float, base64_frame: str) -> str:
+    """Ask the Vision model to describe one key frame."""
+    response = groq_call(
+        client.chat.completions.create,
+        model=VISION_MODEL,
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": f"This is a key frame from a video at timestamp {t:.2f}s. Describe the visual context briefly."},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_frame}"}}
+            ]
+        }],
+        max_tokens=256,
+    )
+    return f"[@{t:.2f}s]: {response.choices[0].message.content}"
+
+
+_FRAME_LINE_RE = re.compile(r'^[\s*#]*Frame\s+(\d+)\b[\s*]*[:.)\-]?[\s*]*(.*)$', re.IGNORECASE | re.MULTILINE)
+
+
+def _split_frame_answer(answer: str, n: int) -> Optional[List[str]]:
+    """Split a numbered "Frame i: ..." answer into n descriptions, or None if any is missing."""
+    matches = list(_FRAME_LINE_RE.finditer(answer))
+    descriptions: Dict[int, str] = {}
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        # A description runs until the next "Frame" line
+        body = answer[m.start(2):nxt.start() if nxt else len(answer)].strip()
+        idx = int(m.group(1))
+        if 1 <= idx <= n and body and idx not in descriptions:
+            descriptions[idx] = body
+    if len(descriptions) != n:
+        return None
+    return [descriptions[i] for i in range(1, n + 1)]
+
+
+def _describe_frames(client, frames: List[Tuple[float, str]]) -> List[str]:
+    """
+    Describe all key frames in one multi-image Vision request. Falls back to one
+    request per frame if the batch is rejected or the answer can't be split per frame.
+    """
+    if len(frames) > 1 and len(frames) <= VIDEO_FRAMES_PER_REQUEST:
+        stamps = ", ".join(f"{i}: {t:.2f}s" for i, (t, _) in enumerate(frames, 1))
+        content = [{
+            "type": "text",
+            "text": (f"These are {len(frames)} key frames from a video, in order (frame: timestamp — {stamps}). "
+                     "Describe the visual context of each frame briefly. Answer with exactly one entry per frame, "
+                     "each starting on a new line as 'Frame <number>: <description>'."),
+        }]
+        content += [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}} for _, b64 in frames]
+        try:
+            response = groq_call(
+                client.chat.completions.create,
+                model=VISION_MODEL,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=256 * len(frames),
+            )
+            parts = _split_frame_answer(response.choices[0].message.content or "", len(frames))
+            if parts is not None:
+                return [f"[@{t:.2f}s]: {desc}" for (t, _), desc in zip(frames, parts)]
+        except BadRequestError:
+            pass  # e.g. too many images or the request exceeds the model's context
+    if len(frames) <= 1:
+        return [_describe_frame(client, t, b64) for t, b64 in frames]
+    with ThreadPoolExecutor(max_workers=len(frames)) as ex:
+        return list(ex.map(lambda frame: _describe_frame(client, *frame), frames))
+
+
+@_disk_cached
+def parse_video(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     """
     Industry-grade Video Analysis.
     1. Extracts audio and transcribes (Whisper).
     2. Captures key frames and analyzes visuals (Vision).
     """
+    if data is not None:
+        # ffmpeg needs a seekable file; stage the bytes under the original name.
+        # Recurse into the undecorated parser: the disk cache was already checked for these bytes.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir) / Path(file_path).name
+            tmp_path.write_bytes(data)
+            return parse_video.__wrapped__(str(tmp_path))
+
     client = get_groq_client()
     try:
-        from moviepy.editor import VideoFileClip
-        import tempfile
-
-        clip = VideoFileClip(file_path)
-        duration = clip.duration
-        fps = clip.fps
-        
-        # 1. Handle Audio Transcription
-        audio_content = "No audio track found."
-        if clip.audio:
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_audio:
-                audio_path = tmp_audio.name
-                clip.audio.write_audiofile(audio_path, logger=None)
-                
-                audio_parsed = parse_audio(audio_path)
-                audio_content = audio_parsed.content
-                os.unlink(audio_path)
-
-        # 2. Key Frame Visual Analysis (Sample at 0s, mid, and end)
-        visual_descriptions = []
-        if client and duration > 0:
-            sample_times = [0, duration/2, duration - 0.1] if duration > 5 else [0]
-            for i, t in enumerate(sample_times):
-                frame_path = f"{file_path}_frame_{i}.jpg"
-                clip.save_frame(frame_path, t=t)
-                
-                # Analyze frame
-                base64_frame = encode_image(frame_path)
-                response = client.chat.completions.create(
-                    model=VISION_MODEL,
-                    messages=[{
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": f"This is a key frame from a video at timestamp {t:.2f}s. Describe the visual context briefly."},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_frame}"}}
-                        ]
-                    }],
-                    max_tokens=256,
-                )
-                visual_descriptions.append(f"[@{t:.2f}s]: {response.choices[0].message.content}")
-                os.unlink(frame_path)
+        ffmpeg = _ffmpeg_exe()
+        info = _probe_video(ffmpeg, file_path)
+        duration = info["duration"]
+
+        # Audio extraction + Whisper upload overlap with frame grabbing and the Vision call
+        with ThreadPoolExecutor(max_workers=4) as ex, tempfile.TemporaryDirectory() as frame_dir:
+            # 1. Handle Audio Transcription
+            audio_future = ex.submit(_transcribe_video_audio, ffmpeg, file_path) if info["has_audio"] else None
+
+            # 2. Key Frame Visual Analysis (Sample at 0s, mid, and end), one batched Vision request
+            frames_future = None
+            if client and duration > 0:
+                sample_times = [0, duration/2, duration - 0.1] if duration > 5 else [0]
+                frames = [(t, encode_image(frame_path))
+                          for t, frame_path in _extract_frames(ffmpeg, file_path, sample_times, frame_dir)]
+                frames_future = ex.submit(_describe_frames, client, frames)
+
+            visual_descriptions = frames_future.result() if frames_future else []
+            audio_content, audio_error = audio_future.result() if audio_future else ("No audio track found.", None)
 
         visual_summary = "\n".join(visual_descriptions)
-        content = f"--- Video Analysis ---\nDuration: {duration:.2f}s\nResolution: {clip.w}x{clip.h}\n\n--- Visual Summary ---\n{visual_summary}\n\n{audio_content}"
-        
-        clip.close()
+        content = f"--- Video Analysis ---\nDuration: {duration:.2f}s\nResolution: {info['width']}x{info['height']}\n\n--- Visual Summary ---\n{visual_summary}\n\n{audio_content}"
+
+        metadata = {
+            "duration": duration,
+            "width": info["width"],
+            "height": info["height"],
+            "fps": info["fps"]
+        }
+        if audio_error:
+            # Partial result: flag it so a transient Whisper failure isn't cached with the video
+            metadata["error"] = f"Audio transcription failed: {audio_error}"
+
         return ParsedDocument(
             filename=Path(file_path).name,
             file_type="video",
             content=content,
-            metadata={
-                "duration": duration,
-                "width": clip.w,
-                "height": clip.h,
-                "fps": fps
-            }
+            metadata=metadata,
         )
 
     except Exception as e:
         return ParsedDocument(
             filename=Path(file_path).name,
             file_type="video",
-            content=f"[Video processing failed: {str(e)}]. Support for video requires moviepy and ffmpeg.",
+            content=f"[Video processing failed: {str(e)}]. Support for video requires ffmpeg.",
             metadata={"error": str(e)}
         )
 
@@ -243,16 +629,58 @@ def parse_video(file_path: str) -> ParsedDocument:
 #  EXISTING DOCUMENT PARSERS (REFINED)
 # ═══════════════════════════════════════════════════════════════════════
 
-def parse_pdf(file_path: str) -> ParsedDocument:
-    """Extract text from a PDF file."""
-    reader = pypdf.PdfReader(file_path)
-    pages = []
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf  # PyMuPDF < 1.24 only ships the legacy name
+    return pymupdf
+
+
+def _parse_pdf_pymupdf(file_path: str, data: Optional[bytes]) -> ParsedDocument:
+    """Extract text with PyMuPDF, whose per-page extraction runs in native MuPDF code."""
+    # Serial on purpose: PyMuPDF holds the GIL during extraction and is not thread-safe
+    pymupdf = _import_pymupdf()
+    doc = pymupdf.open(stream=data, filetype="pdf") if data is not None else pymupdf.open(file_path)
+    try:
+        pages = []
+        for i, page in enumerate(doc):
+            text = page.get_text("text")
+            if text.strip():
+                pages.append(f"[Page {i + 1}]\n{text}")
+        page_count = doc.page_count
+    finally:
+        doc.close()
+
+    return ParsedDocument(
+        filename=Path(file_path).name,
+        file_type="pdf",
+        content="\n\n".join(pages),
+        page_count=page_count,
+        metadata={"total_pages": page_count},
+    )
+
+
+def parse_pdf(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
+    """Extract text from a PDF file (PyMuPDF when installed, else pypdf)."""
+    try:
+        return _parse_pdf_pymupdf(file_path, data)
+    except Exception:
+        # PyMuPDF missing or unable to open the file: fall through to pypdf
+        pass
+
+    # pypdf stays serial: its extraction holds the GIL and a reader's stream can't be shared across threads
+    reader = pypdf.PdfReader(_source(file_path, data))
+    buf = io.StringIO()
     for i, page in enumerate(reader.pages):
         text = page.extract_text() or ""
         if text.strip():
-            pages.append(f"[Page {i + 1}]\n{text}")
+            if buf.tell():
+                buf.write("\n\n")
+            buf.write(f"[Page {i + 1}]\n")
+            buf.write(text)
 
-    content = "\n\n".join(pages)
+    content = buf.getvalue()
     return ParsedDocument(
         filename=Path(file_path).name,
         file_type="pdf",
@@ -262,85 +690,186 @@ def parse_pdf(file_path: str) -> ParsedDocument:
     )
 
 
-def parse_docx(file_path: str) -> ParsedDocument:
+# WordprocessingML namespace and the text each run-level element contributes (as in python-docx)
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W = "{%s}" % _W_NS
+_DOCX_FIXED_TEXT = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+
+@functools.lru_cache(maxsize=1)
+def _docx_run_content():
+    """Compiled XPath selecting a paragraph's text-bearing run children, in document order."""
+    from lxml import etree
+    inner = "*[self::w:t or self::w:tab or self::w:br or self::w:cr or self::w:noBreakHyphen or self::w:ptab]"
+    return etree.XPath(f"w:r/{inner} | w:hyperlink/w:r/{inner}", namespaces={"w": _W_NS})
+
+
+def _docx_paragraph_text(p) -> str:
+    """
+    Same text as python-docx's Paragraph.text, from one compiled XPath over the raw
+    w:p element instead of per-paragraph/per-run proxy objects and XPath compiles.
+    """
+    parts = []
+    for e in _docx_run_content()(p):
+        tag = e.tag
+        if tag == _W + "t":
+            parts.append(e.text or "")
+        elif tag == _W + "br":
+            parts.append("\n" if e.get(_W + "type", "textWrapping") == "textWrapping" else "")
+        else:
+            parts.append(_DOCX_FIXED_TEXT[tag])
+    return "".join(parts)
+
+
+def _docx_cell_text(cell) -> str:
+    return "\n".join(_docx_paragraph_text(p) for p in cell._tc.iterchildren(_W + "p"))
+
+
+def parse_docx(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     """Extract text from a Word document."""
     import docx
-    doc = docx.Document(file_path)
-    full_text = [para.text for para in doc.paragraphs if para.text.strip()]
-    content = "\n".join(full_text).strip()
+    doc = docx.Document(_source(file_path, data))
+    # Written straight into one buffer rather than collected into lists and joined
+    buf = io.StringIO()
 
-    # Tables
-    tables_text = []
-    for i, table in enumerate(doc.tables):
-        table_rows = []
-        for row in table.rows:
-            cells = [cell.text.strip() for cell in row.cells]
-            table_rows.append(" | ".join(cells))
-        tables_text.append(f"\n[Table {i + 1}]\n" + "\n".join(table_rows))
+    last = ""
+    for text in map(_docx_paragraph_text, doc.element.body.iterchildren(_W + "p")):
+        if text.strip():
+            if last:
+                buf.write("\n")
+            else:
+                text = text.lstrip()
+            buf.write(text)
+            last = text
+    if last:
+        # Trim the final paragraph's trailing whitespace, as strip() on the joined text would
+        buf.seek(buf.tell() - (len(last) - len(last.rstrip())))
+        buf.truncate()
 
-    if tables_text:
-        content += "\n\n--- Tables ---\n" + "\n".join(tables_text)
+    # Tables
+    tables = doc.tables
+    if tables:
+        buf.write("\n\n--- Tables ---\n")
+        for i, table in enumerate(tables):
+            if i:
+                buf.write("\n")
+            buf.write(f"\n[Table {i + 1}]\n")
+            buf.write("\n".join(" | ".join(_docx_cell_text(cell).strip() for cell in row.cells) for row in table.rows))
+    content = buf.getvalue()
 
     return ParsedDocument(
         filename=Path(file_path).name,
         file_type="docx",
         content=content,
-        metadata={"table_count": len(doc.tables)},
+        metadata={"table_count": len(tables)},
     )
 
 
-def parse_csv(file_path: str) -> ParsedDocument:
+def parse_csv(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     """Extract text from a CSV file using built-in csv module."""
     rows = []
     try:
-        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-            reader = csv.reader(f)
-            for i, row in enumerate(reader):
-                if i < 150: # Limit for cloud analysis
-                    rows.append(" | ".join(row))
-                else:
-                    break
+        # Stream-decode only as much as the row limit needs instead of decoding the whole file
+        with _open_text(file_path, data) as f:
+            for row in itertools.islice(csv.reader(f), CSV_MAX_ROWS):
+                rows.append(" | ".join(row))
     except Exception:
         pass
     content = "\n".join(rows)
     return ParsedDocument(filename=Path(file_path).name, file_type="csv", content=content or "[Empty CSV]")
 
-def parse_excel(file_path: str) -> ParsedDocument:
+def parse_excel(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     return ParsedDocument(filename=Path(file_path).name, file_type="xlsx", content="[Excel analysis currently limited to local deployment. Please use CSV in the cloud.]")
 
 
-def parse_json(file_path: str) -> ParsedDocument:
-    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-        data = json.load(f)
+def _format_json(raw: bytes) -> Tuple[str, Any]:
+    """Pretty-print JSON as 2-space indented text, via orjson when available."""
+    # Keep documents whose numbers orjson would read or print differently on the stdlib path
+    if orjson is not None and not _JSON_NUMBER_GUARD_RE.search(raw):
+        try:
+            payload = orjson.loads(raw)
+            return orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode("utf-8"), payload
+        except (orjson.JSONDecodeError, TypeError):
+            # NaN/Infinity or invalid UTF-8: let the stdlib path decide
+            pass
+    payload = json.loads(raw.decode("utf-8", errors="replace"))
+    return json.dumps(payload, indent=2, ensure_ascii=False), payload
+
+
+def parse_json(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
+    content, payload = _format_json(_read_bytes(file_path, data))
     return ParsedDocument(
         filename=Path(file_path).name,
         file_type="json",
-        content=json.dumps(data, indent=2, ensure_ascii=False),
-        metadata={"is_list": isinstance(data, list)}
+        content=content,
+        metadata={"is_list": isinstance(payload, list)}
     )
 
-def parse_txt(file_path: str) -> ParsedDocument:
-    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-        content = f.read()
+@functools.lru_cache(maxsize=1)
+def _lexbor_parser():
+    """selectolax's Lexbor HTML parser class, or None when selectolax isn't installed."""
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError:
+        return None
+    return LexborHTMLParser
+
+
+def _tidy_text(text: str) -> str:
+    """Collapse runs of spaces, trim lines and squeeze blank lines to one."""
+    text = "\n".join(line.strip() for line in _RE_WS.sub(" ", text).split("\n"))
+    return _RE_BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _strip_html(raw: str) -> str:
+    """
+    HTML to text. Uses selectolax (native Lexbor parser) when available, else regex stripping.
+    Both keep block boundaries as line breaks.
+    """
+    parser_cls = _lexbor_parser()
+    if parser_cls is not None:
+        # Mark block boundaries with newline text nodes before parsing so they survive text()
+        tree = parser_cls(_RE_BLOCK.sub("\n\\g<0>", raw))
+        tree.strip_tags(["script", "style", "noscript"])
+        root = tree.body or tree.root
+        return _tidy_text(root.text(separator="", strip=False) if root is not None else "")
+
+    text = _RE_SCRIPT.sub(" ", raw)
+    text = _RE_COMMENT.sub(" ", text)
+    text = _RE_BLOCK.sub("\n", text)
+    return _tidy_text(html.unescape(_RE_TAG.sub(" ", text)))
+
+
+def parse_html(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
+    """Extract readable text from an HTML page (scripts, styles and markup removed)."""
+    content = _strip_html(_read_text(file_path, data))
+    return ParsedDocument(filename=Path(file_path).name, file_type="html", content=content or "[Empty HTML]")
+
+
+def parse_txt(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
+    content = _read_text(file_path, data)
     return ParsedDocument(filename=Path(file_path).name, file_type="txt", content=content)
 
 
-def parse_text_fallback(file_path: str) -> ParsedDocument:
+def parse_text_fallback(file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
     """Fallback for any text/code file."""
     ext = Path(file_path).suffix.lower().lstrip(".")
     try:
-        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-            content = f.read()
-        
-        # Binary check
-        non_printable = sum(1 for c in content[:2000] if not c.isprintable() and c not in '\n\r\t')
-        if len(content[:2000]) > 0 and (non_printable / min(len(content), 2000)) > 0.15:
+        # Binary check on the raw head bytes, before paying to decode the whole file
+        if data is not None:
+            head = data[:BINARY_SNIFF_BYTES]
+        else:
+            with open(file_path, "rb") as f:
+                head = f.read(BINARY_SNIFF_BYTES)
+        non_printable = len(head) - len(head.translate(None, _CONTROL_BYTES))
+        if head and non_printable / len(head) > 0.15:
             return ParsedDocument(
                 filename=Path(file_path).name,
                 file_type=ext or "binary",
                 content=f"[Binary file: {Path(file_path).name}. No text extracted.]"
             )
-        
+
+        content = _read_text(file_path, data)
         return ParsedDocument(filename=Path(file_path).name, file_type=ext, content=content)
     except Exception:
         return ParsedDocument(filename=Path(file_path).name, file_type="unknown", content="[Unreadable file]")
@@ -358,6 +887,7 @@ PARSERS = {
     ".xlsx": parse_excel, ".xls": parse_excel,
     ".json": parse_json,
     ".txt": parse_txt,
+    ".html": parse_html, ".htm": parse_html,
     # Images (Multi-modal)
     ".jpg": parse_image, ".jpeg": parse_image, ".png": parse_image, ".webp": parse_image,
     # Video (Multi-modal)
@@ -367,17 +897,53 @@ PARSERS = {
 }
 
 TEXT_EXTENSIONS = {
-    ".md", ".markdown", ".yaml", ".yml", ".jsonl", ".py", ".js", ".ts", ".html", ".css", ".sql", ".sh"
+    ".md", ".markdown", ".yaml", ".yml", ".jsonl", ".py", ".js", ".ts", ".css", ".sql", ".sh"
 }
+# Known text/code types dispatch explicitly; anything else falls back to the same parser
+PARSERS.update({ext: parse_text_fallback for ext in TEXT_EXTENSIONS})
 
 def parse_file(file_path: str) -> ParsedDocument:
-    ext = Path(file_path).suffix.lower()
-    parser = PARSERS.get(ext)
-    
-    if parser:
-        return parser(file_path)
-    
-    if ext in TEXT_EXTENSIONS:
-        return parse_text_fallback(file_path)
-    
-    return parse_text_fallback(file_path)
+    return PARSERS.get(Path(file_path).suffix.lower(), parse_text_fallback)(file_path)
+
+
+# LRU of (content sha256, filename) -> ParsedDocument, so re-uploading an identical file is free
+_PARSE_CACHE: "OrderedDict[Tuple[str, str], ParsedDocument]" = OrderedDict()
+_PARSE_CACHE_LOCK = threading.Lock()
+_parse_cache_chars = 0
+
+
+def invalidate_parse_cache():
+    """Drop every cached upload parse."""
+    global _parse_cache_chars
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE.clear()
+        _parse_cache_chars = 0
+
+
+def parse_bytes(content: bytes, filename: str) -> ParsedDocument:
+    """Parse an in-memory upload without staging it on disk. `filename` drives dispatch and metadata."""
+    global _parse_cache_chars
+    # The filename is part of the key: it picks the parser and is stored on the result
+    key = (hashlib.sha256(content).hexdigest(), filename)
+    with _PARSE_CACHE_LOCK:
+        cached = _PARSE_CACHE.get(key)
+        if cached is not None:
+            _PARSE_CACHE.move_to_end(key)
+            return cached
+
+    ext = Path(filename).suffix.lower()
+    parser = PARSERS.get(ext, parse_text_fallback)
+    result = parser(filename, data=content)
+
+    # Failed parses (e.g. a transient Groq error) are retried on the next upload
+    if "error" not in result.metadata and len(result.content) <= PARSE_CACHE_MAX_CHARS:
+        with _PARSE_CACHE_LOCK:
+            old = _PARSE_CACHE.pop(key, None)
+            if old is not None:
+                _parse_cache_chars -= len(old.content)
+            _PARSE_CACHE[key] = result
+            _parse_cache_chars += len(result.content)
+            while len(_PARSE_CACHE) > PARSE_CACHE_MAX_ENTRIES or _parse_cache_chars > PARSE_CACHE_MAX_CHARS:
+                _, evicted = _PARSE_CACHE.popitem(last=False)
+                _parse_cache_chars -= len(evicted.content)
+    return result